@@ -2,24 +2,39 @@
 Flask YOLO检测应用主文件
 优化后的模块化结构
 """
-from flask import Flask, render_template, request, jsonify, url_for
+from flask import Flask, Response, g, render_template, request, jsonify, url_for, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
+import json
 import logging
-import shutil
+import multiprocessing
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, List
 
 # 导入自定义模块
 from config import config
 from detector import detector
-from utils_app import file_manager, setup_logging, create_directories, validate_image_file, format_response
+from batcher import batch_scheduler
+from batch_detect import batch_detector
+from jobs import job_manager
+from worker_pool import worker_pool
+from cache import result_cache
+from retention import retention_service
+from memory import memory_policy
+from storage import result_store
+from upload_stream import UploadRequest, upload_bytes
+from metrics import metrics, stage_timer, QUEUE_DEPTH, REQUESTS_TOTAL, REQUEST_SECONDS
+from utils_app import file_manager, setup_logging, create_directories, validate_image_file, format_response, parse_bool
 
 # 初始化应用
 app = Flask(__name__, 
            static_folder=config.app.static_folder,
            template_folder=config.app.template_folder)
 app.config['MAX_CONTENT_LENGTH'] = config.app.max_upload_size_mb * 1024 * 1024
+# 上传文件边接收边校验大小、计算哈希，图片留在内存、视频直接写入上传目录
+app.request_class = UploadRequest
 
 # 设置日志
 setup_logging()
@@ -28,24 +43,76 @@ logger = logging.getLogger(__name__)
 # 创建必要目录
 create_directories()
 
-# 预加载模型
-if not detector.load_model():
-    logger.error("模型预加载失败，应用可能无法正常工作")
-else:
+
+def _init_inference():
+    """
+    预加载模型并启动推理执行器（多进程工作池优先，其次为进程内微批处理）
+    
+    使用工作池时图片推理在工作进程中执行，Web进程的模型只服务视频等进程内路径，不做预热和启动自测，
+    把启动时的CPU留给工作进程
+    """
+    if not detector.load_model(warmup=not worker_pool.enabled):
+        logger.error("模型预加载失败，应用可能无法正常工作")
+        return
+    
     logger.info("YOLO模型预加载成功")
+    if worker_pool.enabled:
+        worker_pool.start()
+        detector.executor = worker_pool
+    elif batch_scheduler.enabled:
+        batch_scheduler.start()
+        detector.executor = batch_scheduler
+
+
+# 工作进程以spawn方式启动时会重新导入主模块，子进程中跳过初始化
+if multiprocessing.parent_process() is None:
+    _init_inference()
+    retention_service.start()
+    memory_policy.start()
+
+# 采集指标时读取的队列深度和缓存统计
+QUEUE_DEPTH.set_function(lambda: batch_scheduler.queue_depth, executor='batch')
+QUEUE_DEPTH.set_function(lambda: worker_pool.queue_depth, executor='worker_pool')
+QUEUE_DEPTH.set_function(lambda: job_manager.queue_depth, executor='jobs')
+_cache_lookups = metrics.gauge('yolo_cache_lookups', 'Result cache lookups since startup', ['result'])
+_cache_lookups.set_function(lambda: result_cache.stats()['memory_hits'], result='memory_hit')
+_cache_lookups.set_function(lambda: result_cache.stats()['disk_hits'], result='disk_hit')
+_cache_lookups.set_function(lambda: result_cache.stats()['misses'], result='miss')
+
+
+@app.before_request
+def _start_timer():
+    """记录请求开始时间"""
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def _record_request(response):
+    """记录请求数和请求耗时，按路由规则而不是实际URL分组"""
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
 
 
 # ==================== 公共检测函数 ====================
 
-def _process_detection(file) -> Tuple[bool, Optional[Path], Optional[Path], str]:
+def _process_detection(file, render: bool = True,
+                       with_original: bool = False) -> Tuple[bool, Optional[Path], Optional[dict], str]:
     """
     处理文件检测的公共逻辑
     
+    图片直接在内存中解码检测，只写出结果图片；视频需要先保存上传文件再逐帧检测
+    
     Args:
         file: 上传的文件对象
+        render: 是否渲染并保存结果图片，为False时图片只返回检测数据（视频始终渲染）
+        with_original: 图片是否同时保存原图的缩小版本
         
     Returns:
-        (成功标志, 上传文件路径, 结果目录路径, 错误消息)
+        (成功标志, 上传文件路径（图片为None）, 检测结果字典, 错误消息)
+        检测结果字典包含save_path（结果文件路径，未渲染时为None），图片还包含detections、shape和variants
     """
     try:
         # 验证文件
@@ -53,8 +120,13 @@ def _process_detection(file) -> Tuple[bool, Optional[Path], Optional[Path], str]
         if not is_valid:
             return False, None, None, error_msg
         
-        # 保存上传的文件
-        file_path = file_manager.save_uploaded_file(file, 'images')
+        # 按文件头识别出的类型分流，扩展名与内容不符时以内容为准
+        kind, fmt = file_manager.sniff(file)
+        if kind != 'video':
+            return _process_image_detection(file, render, with_original)
+        
+        # 保存上传的视频文件（扩展名按实际格式，数据加载器据此选择读取方式）
+        file_path = file_manager.save_uploaded_file(file, 'videos', extension=fmt)
         if not file_path:
             return False, None, None, "文件保存失败"
         
@@ -64,24 +136,106 @@ def _process_detection(file) -> Tuple[bool, Optional[Path], Optional[Path], str]
         result_dir = detector.detect(file_path)
         
         if not result_dir:
-            file_path.unlink(missing_ok=True)
+            file_manager.discard(file_path)
             return False, file_path, None, "目标检测失败"
         
         # 检查结果文件
-        result_files = list(result_dir.glob('*'))
+        result_files = [f for f in result_dir.glob('*') if f.is_file()]
         if not result_files:
-            file_path.unlink(missing_ok=True)
-            shutil.rmtree(result_dir, ignore_errors=True)
+            file_manager.discard(file_path)
+            file_manager.discard(result_dir)
             return False, file_path, None, "未生成检测结果"
         
         logger.info(f"检测完成，生成 {len(result_files)} 个结果文件")
-        return True, file_path, result_dir, ""
+        return True, file_path, {'save_path': result_files[0]}, ""
         
     except Exception as e:
         logger.error(f"检测过程异常: {e}")
         return False, None, None, f"服务器内部错误: {str(e)}"
 
 
+def _process_image_detection(file, render: bool = True,
+                             with_original: bool = False) -> Tuple[bool, Optional[Path], Optional[dict], str]:
+    """
+    在内存中完成图片检测，上传内容不落盘
+    
+    Args:
+        file: 已通过验证的上传文件对象
+        render: 是否渲染并保存结果图片，为False时跳过绘制和编码
+        with_original: 是否同时保存原图的缩小版本
+        
+    Returns:
+        (成功标志, None, 检测结果字典, 错误消息)
+    """
+    logger.info(f"开始处理图片: {file.filename}")
+    
+    # 并发请求会经过微批处理调度器合并为一次前向推理
+    data, content_hash = upload_bytes(file)
+    result = detector.detect_bytes(
+        data,
+        render=False,
+        persist=render,
+        filename=file_manager.generate_unique_filename(file.filename),
+        with_original=with_original,
+        content_hash=content_hash
+    )
+    if not result:
+        return False, None, None, "目标检测失败"
+    
+    logger.info(f"检测完成，共 {len(result['detections'])} 个目标: {result['save_path']}")
+    if result.get('encode'):
+        encoded = result['encode']
+        logger.info(f"结果图片编码: {encoded['size'][0]}x{encoded['size'][1]} {encoded['ext']}, "
+                    f"{encoded['bytes'] / 1024:.1f}KB, {encoded['seconds'] * 1E3:.1f}ms ({encoded['backend']})")
+    return True, None, result, ""
+
+
+def _variant_links(result: dict, kind: str, full_url: str, full_path: Path,
+                   full_size: Tuple[int, int]) -> List[Dict[str, Any]]:
+    """
+    列出结果目录中的缩小版本和原尺寸文件
+    
+    Args:
+        result: 检测结果字典（含save_path和variants）
+        kind: 'result'（检测结果）或 'original'（原图）
+        full_url, full_path, full_size: 原尺寸文件的URL、路径和(w, h)
+        
+    Returns:
+        [{'url', 'width', 'height', 'bytes'}, ...]，按尺寸从小到大排列，最后一项为原尺寸文件
+    """
+    links = []
+    variants = (result.get('variants') or {}).get(kind) or []
+    for item in variants:
+        url = file_manager.get_result_url(result['save_path'].parent / item['name'])
+        if url:
+            links.append({'url': url, 'width': item['size'][0], 'height': item['size'][1], 'bytes': item['bytes']})
+    links.append({'url': full_url, 'width': full_size[0], 'height': full_size[1],
+                  'bytes': full_path.stat().st_size if full_path.exists() else 0})
+    return links
+
+
+def _fit_variant(links: List[Dict[str, Any]], size: Optional[int]) -> Dict[str, Any]:
+    """选取最长边不小于size的最小版本，size为None或都不够大时返回原尺寸文件"""
+    if size:
+        for link in links:
+            if max(link['width'], link['height']) >= size:
+                return link
+    return links[-1]
+
+
+def _discard_result(result: dict):
+    """删除本次请求生成的结果目录；命中缓存的结果目录由之前的请求和缓存条目共享，保留不删"""
+    if result['save_path'] and not result.get('cached'):
+        file_manager.discard(result['save_path'].parent)
+
+
+def _srcset(links: List[Dict[str, Any]]) -> Optional[str]:
+    """生成img标签的srcset属性，没有缩小版本时返回None"""
+    if len(links) < 2:
+        return None
+    return ', '.join(f"{link['url']} {link['width']}w" for link in links)
+
+
 # ==================== 路由定义 ====================
 
 @app.route("/")
@@ -121,51 +275,231 @@ def api_detect():
     """
     API检测接口
     返回JSON格式的检测结果
+    
+    图片结果包含结构化的目标列表（xyxy、归一化xywh、置信度、类别）；
+    传入 render=false 时跳过绘制和编码，只返回检测数据；
+    传入 size（显示尺寸，像素）时 result_urls 给出最长边不小于该值的最小版本
     """
     try:
         if 'file' not in request.files:
             return jsonify(format_response(False, "请选择文件")), 400
         
         file = request.files['file']
+        render = parse_bool(request.values.get('render'), default=True)
+        size = request.values.get('size', type=int)
         
         # 执行检测（使用公共函数）
-        success, file_path, result_dir, error_msg = _process_detection(file)
+        success, file_path, result, error_msg = _process_detection(file, render=render)
         
         if not success:
             return jsonify(format_response(False, error_msg)), 400 if "不支持" in error_msg or "请选择" in error_msg else 500
         
-        # 获取结果文件URL
-        result_files = list(result_dir.glob('*'))
-        result_urls = []
-        for result_file in result_files:
-            if result_file.is_file():
-                result_url = file_manager.get_result_url(result_file)
-                if result_url:
-                    result_urls.append(result_url)
-        
         # 清理上传的文件
-        if file_path and file_path.exists():
-            file_path.unlink(missing_ok=True)
+        if file_path:
+            file_manager.discard(file_path)
+        
+        data = {'original_filename': file.filename}
+        if 'detections' in result:
+            h, w = result['shape']
+            data.update({
+                'detections': result['detections'],
+                'detection_count': len(result['detections']),
+                'image_size': [w, h]
+            })
         
-        if not result_urls:
-            shutil.rmtree(result_dir, ignore_errors=True)
-            return jsonify(format_response(False, "无法生成结果URL")), 500
+        result_path = result['save_path']
+        if result_path:
+            # 获取结果文件URL
+            result_url = file_manager.get_result_url(result_path)
+            if not result_url:
+                _discard_result(result)
+                return jsonify(format_response(False, "无法生成结果URL")), 500
+            if 'detections' in result:
+                full_size = result['encode']['size'] if result.get('encode') else (w, h)
+                links = _variant_links(result, 'result', result_url, result_path, full_size)
+                result_url = _fit_variant(links, size)['url']
+                data['variants'] = links
+            data.update({
+                'result_urls': [result_url],
+                'result_count': 1
+            })
         
+        encoded = result.get('encode')
+        if encoded:
+            data['encoding'] = {
+                'format': encoded['ext'].lstrip('.'),
+                'size': list(encoded['size']),
+                'bytes': encoded['bytes'],
+                'encode_ms': round(encoded['seconds'] * 1E3, 2),
+                'backend': encoded['backend']
+            }
+        
+        return jsonify(format_response(True, "检测成功", data))
+        
+    except RequestEntityTooLarge:
+        raise  # 上传超限时由413错误处理返回
+        
+    except Exception as e:
+        logger.error(f"API检测异常: {e}")
+        return jsonify(format_response(False, f"服务器内部错误: {str(e)}")), 500
+
+
+@app.route("/api/detect/batch", methods=['POST'])
+def api_detect_batch():
+    """
+    批量检测接口
+    一个请求上传多张图片（多个file字段）或图片压缩包（zip/tar），按批前向推理，
+    以NDJSON逐行返回：每张图片一行检测结果，最后一行为汇总
+    
+    传入 batch_size 时覆盖每次前向推理的图片数（不超过 YOLOConfig.batch_max_size）
+    """
+    # 读取表单前放宽本请求的大小和表单字段数上限；留在内存中的图片仍按max_upload_size_mb限制，
+    # 只有写入磁盘的压缩包可以用满整个请求的大小
+    request.max_content_length = config.app.batch_max_upload_mb * 1024 * 1024
+    request.max_form_parts = config.app.batch_max_files + 100
+    request.max_archive_size = request.max_content_length
+    
+    # 上传超限时由413错误处理返回；上传流在视图返回后即关闭，检测前先取走内容
+    uploads = batch_detector.take_uploads(request.files.getlist('file'))
+    if not uploads:
+        return jsonify(format_response(False, "请选择文件")), 400
+    batch_size = request.values.get('batch_size', type=int)
+    if batch_size is not None:
+        batch_size = min(max(batch_size, 1), max(config.yolo.batch_max_size, 1))
+    
+    def generate():
+        start = time.perf_counter()
+        total = succeeded = detections = 0
+        try:
+            for item in batch_detector.run(uploads, batch_size):
+                total += 1
+                succeeded += item['success']
+                detections += item.get('detection_count', 0)
+                yield json.dumps(item, ensure_ascii=False) + '\n'
+            summary = {'summary': True, 'success': True, 'total': total, 'succeeded': succeeded,
+                       'failed': total - succeeded, 'detection_count': detections}
+        except Exception as e:
+            logger.error(f"批量检测异常: {e}")
+            summary = {'summary': True, 'success': False, 'message': f"服务器内部错误: {str(e)}",
+                       'total': total, 'succeeded': succeeded, 'failed': total - succeeded,
+                       'detection_count': detections}
+        summary['elapsed_ms'] = round((time.perf_counter() - start) * 1E3, 2)
+        logger.info(f"批量检测完成: {total} 张图片，成功 {succeeded} 张，耗时 {summary['elapsed_ms']}ms")
+        yield json.dumps(summary, ensure_ascii=False) + '\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # 客户端在响应开始前断开时生成器不会执行，压缩包文件在响应关闭时删除
+    response.call_on_close(lambda: batch_detector.release(uploads))
+    return response
+
+
+@app.route("/api/detect/stream", methods=['POST'])
+def api_detect_stream():
+    """
+    视频流式检测接口
+    逐帧返回检测结果，每帧推理完成后立即发送，不等整个视频处理完
+    
+    传入 format=sse（或请求头 Accept: text/event-stream）时以Server-Sent Events返回，否则为NDJSON；
+    传入 render=true 时同时绘制并保存结果视频，结束事件中给出 result_url
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify(format_response(False, "请选择文件")), 400
+        
+        file = request.files['file']
+        is_valid, error_msg = validate_image_file(file)
+        if not is_valid:
+            return jsonify(format_response(False, error_msg)), 400
+        
+        kind, fmt = file_manager.sniff(file)
+        if kind != 'video':
+            return jsonify(format_response(False, "不支持的文件类型：流式检测只支持视频，图片请使用 /api/detect")), 400
+        
+        file_path = file_manager.save_uploaded_file(file, 'videos', extension=fmt)
+        if not file_path:
+            return jsonify(format_response(False, "文件保存失败")), 500
+        
+        render = parse_bool(request.values.get('render'), default=False)
+        sse = request.values.get('format', '').lower() == 'sse' or \
+            request.accept_mimetypes.best == 'text/event-stream'
+        job = job_manager.submit(file_path, file.filename, render=render, stream=True)
+        
+    except RequestEntityTooLarge:
+        raise  # 上传超限时由413错误处理返回
+        
+    except Exception as e:
+        logger.error(f"提交流式检测异常: {e}")
+        return jsonify(format_response(False, f"服务器内部错误: {str(e)}")), 500
+    
+    def encode(event: dict) -> str:
+        data = json.dumps(event, ensure_ascii=False)
+        return f"event: {event['event']}\ndata: {data}\n\n" if sse else data + '\n'
+    
+    def generate():
+        # 首个事件立即返回任务ID（任务可能仍在排队），客户端断开时关闭事件流即取消任务
+        yield encode({'event': 'job', 'job_id': job.job_id, 'filename': job.filename,
+                      'status_url': url_for('api_get_job', job_id=job.job_id)})
+        events = job_manager.stream(job)
+        try:
+            for event in events:
+                yield encode(event)
+        finally:
+            events.close()
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), headers=headers,
+                    mimetype='text/event-stream' if sse else 'application/x-ndjson')
+
+
+@app.route("/api/jobs", methods=['POST'])
+def api_create_job():
+    """
+    异步检测任务接口
+    保存上传文件后立即返回任务ID，检测在后台执行
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify(format_response(False, "请选择文件")), 400
+        
+        file = request.files['file']
+        is_valid, error_msg = validate_image_file(file)
+        if not is_valid:
+            return jsonify(format_response(False, error_msg)), 400
+        
+        kind, fmt = file_manager.sniff(file)
+        subdirectory = 'videos' if kind == 'video' else 'images'
+        file_path = file_manager.save_uploaded_file(file, subdirectory, extension=fmt)
+        if not file_path:
+            return jsonify(format_response(False, "文件保存失败")), 500
+        
+        job = job_manager.submit(file_path, file.filename)
         return jsonify(format_response(
-            True, 
-            "检测成功", 
+            True,
+            "任务已提交",
             {
-                'result_urls': result_urls,
-                'result_count': len(result_urls),
-                'original_filename': file.filename
+                'job_id': job.job_id,
+                'status': job.status,
+                'status_url': url_for('api_get_job', job_id=job.job_id)
             }
-        ))
+        )), 202
+        
+    except RequestEntityTooLarge:
+        raise  # 上传超限时由413错误处理返回
         
     except Exception as e:
-        logger.error(f"API检测异常: {e}")
+        logger.error(f"提交检测任务异常: {e}")
         return jsonify(format_response(False, f"服务器内部错误: {str(e)}")), 500
 
 
+@app.route("/api/jobs/<job_id>", methods=['GET'])
+def api_get_job(job_id):
+    """查询异步检测任务的进度和结果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify(format_response(False, "任务不存在")), 404
+    return jsonify(format_response(True, "查询成功", job.to_dict()))
+
+
 @app.route("/detect", methods=['POST'])
 def detect():
     """
@@ -179,10 +513,11 @@ def detect():
         file = request.files['file']
         
         # 执行检测（使用公共函数）
-        success, file_path, result_dir, error_msg = _process_detection(file)
+        success, file_path, result, error_msg = _process_detection(file, with_original=True)
         
         if not success:
             return render_template('error.html', error_message=error_msg), 400 if "不支持" in error_msg or "请选择" in error_msg else 500
+        result_path = result['save_path']
         
         # 保存原图到static目录以便展示
         try:
@@ -190,12 +525,21 @@ def detect():
             static_original_path = config.static_path / 'images' / 'original' / original_filename
             static_original_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # 确保源文件存在
-            if not file_path.exists():
-                logger.error(f"源文件不存在: {file_path}")
-                return render_template('error.html', error_message="源文件不存在"), 500
-            
-            shutil.copy2(file_path, static_original_path)
+            if file_path is None:
+                # 图片只在内存中处理过，直接从上传流写出原图
+                file.stream.seek(0)
+                with stage_timer('upload_save'):
+                    file.save(str(static_original_path))
+                result_store.register(static_original_path, 'original')
+            else:
+                # 确保源文件存在
+                if not file_path.exists():
+                    logger.error(f"源文件不存在: {file_path}")
+                    return render_template('error.html', error_message="源文件不存在"), 500
+                
+                # 上传文件检测完后不再需要，直接移动到static目录（跨设备时退回复制）
+                method = result_store.move(file_path, static_original_path, 'original')
+                logger.info(f"原图放置方式: {method}")
             logger.info(f"原图已保存到: {static_original_path}")
             
             # 获取原图URL - 使用Flask的静态文件路由（确保使用正斜杠）
@@ -207,59 +551,94 @@ def detect():
         except Exception as e:
             logger.error(f"保存原图失败: {e}")
             # 清理已生成的检测结果
-            if file_path and file_path.exists():
-                file_path.unlink(missing_ok=True)
-            if result_dir:
-                shutil.rmtree(result_dir, ignore_errors=True)
+            if file_path:
+                file_manager.discard(file_path)
+            _discard_result(result)
             return render_template('error.html', error_message=f"保存原图失败: {str(e)}"), 500
         
-        # 获取第一个结果文件的URL
-        result_files = list(result_dir.glob('*'))
-        result_url = None
-        for result_file in result_files:
-            if result_file.is_file():
-                result_url = file_manager.get_result_url(result_file)
-                if result_url:
-                    break
+        # 获取结果文件的URL
+        result_url = file_manager.get_result_url(result_path)
         
-        # 清理上传的临时文件（保留static中的原图）
+        # 清理上传的临时文件（保留static中的原图；原图已移动过去时索引条目随之转为原图）
         if file_path and file_path.exists():
-            file_path.unlink(missing_ok=True)
+            file_manager.discard(file_path)
         
         if not result_url:
-            static_original_path.unlink(missing_ok=True)
-            shutil.rmtree(result_dir, ignore_errors=True)
+            file_manager.discard(static_original_path)
+            _discard_result(result)
             return render_template('error.html', error_message="无法生成结果URL"), 500
         
         logger.info(f"检测完成，原图URL: {original_url}, 结果URL: {result_url}")
         
-        return render_template('result.html', original_url=original_url, result_url=result_url)
+        # 页面按显示宽度从srcset中选用缩小版本，src保留原尺寸文件供放大查看和下载
+        original_srcset = result_srcset = None
+        if 'detections' in result:
+            h, w = result['shape']
+            full_size = result['encode']['size'] if result.get('encode') else (w, h)
+            original_srcset = _srcset(_variant_links(result, 'original', original_url, static_original_path, (w, h)))
+            result_srcset = _srcset(_variant_links(result, 'result', result_url, result_path, full_size))
+        
+        return render_template('result.html', original_url=original_url, result_url=result_url,
+                               original_srcset=original_srcset, result_srcset=result_srcset)
+        
+    except RequestEntityTooLarge:
+        raise  # 上传超限时由413错误处理返回
         
     except Exception as e:
         logger.error(f"网页检测异常: {e}")
         return render_template('error.html', error_message=f"服务器内部错误: {str(e)}"), 500
 
+def _is_ready() -> bool:
+    """模型是否已加载并预热完成；使用多进程推理时还需至少一个工作进程就绪"""
+    if not detector.ready:
+        return False
+    if detector.executor is worker_pool:
+        return worker_pool.ready
+    return True
+
+
 @app.route("/health")
 def health_check():
-    """健康检查接口"""
+    """
+    健康检查接口
+    模型加载并预热完成前返回503，负载均衡据此只向已就绪的实例转发请求
+    """
+    ready = _is_ready()
     return jsonify({
-        'status': 'healthy',
-        'message': 'YOLO Flask应用运行正常',
+        'status': 'healthy' if ready else 'starting',
+        'ready': ready,
+        'message': 'YOLO Flask应用运行正常' if ready else '模型尚未加载或预热未完成',
         'timestamp': datetime.now().isoformat()
-    })
+    }), 200 if ready else 503
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus格式的性能指标接口"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    """结果缓存命中统计接口"""
+    return jsonify(format_response(True, "查询成功", result_cache.stats()))
 
 
 @app.route("/cleanup", methods=['POST'])
 def cleanup_files():
-    """清理旧文件接口"""
+    """
+    立即执行一次文件清理
+    按索引删除过期和超出总大小预算的文件，不遍历目录树；平时由后台保留策略定期执行
+    """
     try:
-        deleted_count = file_manager.cleanup_old_files(config.uploads_path)
-        deleted_count += file_manager.cleanup_old_files(config.results_path)
+        report = retention_service.run_once()
         
         return jsonify({
             'success': True,
-            'message': f'清理完成，共删除 {deleted_count} 个文件',
-            'deleted_count': deleted_count
+            'message': f"清理完成，共删除 {report['deleted_count']} 个条目，"
+                       f"释放 {report['reclaimed_bytes'] / 1024 / 1024:.2f}MB",
+            **report,
+            'retention': retention_service.stats()
         })
     except Exception as e:
         logger.error(f"文件清理失败: {e}")
@@ -283,9 +662,12 @@ def internal_error(error):
 
 @app.errorhandler(413)
 def too_large(error):
-    """文件过大错误处理"""
-    return render_template('error.html', 
-                         error_message=f"文件过大，最大允许 {config.app.max_upload_size_mb}MB"), 413
+    """文件过大错误处理（上传流接收中途超限时同样由此返回）"""
+    limit = request.max_file_size or request.max_content_length or config.app.max_upload_size_mb * 1024 * 1024
+    message = f"文件过大，最大允许 {limit // (1024 * 1024)}MB"
+    if request.path.startswith('/api/'):
+        return jsonify(format_response(False, message)), 413
+    return render_template('error.html', error_message=message), 413
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+"""
+批量检测模块
+一个请求上传多张图片或图片压缩包（zip/tar，可gzip/bz2/xz压缩），逐张校验解码后按批前向推理，
+每张图片的检测结果在所在批次完成后立即产出，供接口以NDJSON逐行返回
+"""
+import io
+import logging
+import tarfile
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import config
+from cache import result_cache
+from detector import detector, YOLODetector
+from metrics import metrics, stage_timer
+from upload_stream import UploadStream, upload_bytes
+from utils_app import UPLOAD_REJECTIONS_TOTAL, file_manager, validate_content
+
+BATCH_IMAGES_TOTAL = metrics.counter('yolo_batch_images_total', 'Images processed by the batch endpoint', ['result'])
+
+
+class BatchDetector:
+    """批量检测类"""
+
+    def __init__(self, yolo_detector: Optional[YOLODetector] = None):
+        """
+        初始化批量检测器
+
+        Args:
+            yolo_detector: 检测器实例，如果为None则使用全局检测器
+        """
+        self.detector = yolo_detector or detector
+        self.logger = logging.getLogger(__name__)
+
+    def take_uploads(self, files) -> List[tuple]:
+        """
+        取走上传文件的内容，请求结束、上传流关闭之后流式响应仍可读取
+
+        Args:
+            files: 上传的文件对象列表
+
+        Returns:
+            (文件名, 文件头识别结果, 内容) 列表：写入磁盘的压缩包为文件路径（由release删除），
+            其余为文件内容，视频不取出内容（为None）
+        """
+        uploads = []
+        for file in files:
+            if not file or file.filename == '':
+                continue
+            sniffed = file_manager.sniff(file)
+            kind = sniffed[0] if sniffed else None
+            if kind == 'video':
+                uploads.append((file.filename, sniffed, None))
+            elif kind == 'archive' and isinstance(file.stream, UploadStream) and not file.stream.in_memory:
+                uploads.append((file.filename, sniffed, file.stream.detach()))
+            else:
+                uploads.append((file.filename, sniffed, upload_bytes(file)[0]))
+        return uploads
+
+    def release(self, uploads: List[tuple]):
+        """
+        删除take_uploads取走的压缩包文件，可重复调用
+
+        流式响应在客户端断开时可能从未开始执行run，接口需在响应关闭时调用本方法
+
+        Args:
+            uploads: take_uploads的返回值
+        """
+        for _, _, payload in uploads:
+            if isinstance(payload, Path):
+                payload.unlink(missing_ok=True)
+
+    def iter_images(self, uploads: List[tuple]) -> Iterator[Tuple[str, Optional[bytes], str]]:
+        """
+        依次取出上传的图片，压缩包展开为其中的图片，超过batch_max_files张后停止
+
+        Args:
+            uploads: take_uploads的返回值
+
+        Yields:
+            (文件名, 图片内容, 错误消息)，无法取出内容时图片内容为None
+        """
+        limit = config.app.batch_max_files
+        count = 0
+        for upload in uploads:
+            for name, data, error in self._expand(*upload):
+                if count >= limit:
+                    UPLOAD_REJECTIONS_TOTAL.inc(reason='batch_limit')
+                    yield name, None, f"超过单次批量检测的图片数上限 {limit}，其余文件未处理"
+                    return
+                count += 1
+                yield name, data, error
+
+    def _expand(self, filename: str, sniffed: Optional[tuple],
+                payload) -> Iterator[Tuple[str, Optional[bytes], str]]:
+        """取出单个上传文件中的图片，不是压缩包时原样返回"""
+        kind, fmt = sniffed or (None, None)
+        if kind == 'video':
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='format')
+            yield filename, None, f"不支持的文件格式: {fmt}，批量检测只支持图片"
+            return
+        if kind != 'archive':
+            yield filename, payload, ""
+            return
+
+        try:
+            with (open(payload, 'rb') if isinstance(payload, Path) else io.BytesIO(payload)) as stream:
+                if fmt == 'zip':
+                    yield from self._zip_members(filename, stream)
+                else:
+                    yield from self._tar_members(filename, stream)
+        except (zipfile.BadZipFile, tarfile.TarError, EOFError, OSError) as e:
+            self.logger.warning(f"压缩包解析失败 {filename}: {e}")
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='archive')
+            yield filename, None, f"不支持的压缩包：无法解析 ({e})"
+
+    def _zip_members(self, archive: str, stream) -> Iterator[Tuple[str, Optional[bytes], str]]:
+        """逐个读取zip中的文件，读取前按声明的大小检查上限"""
+        budget = _Budget()
+        with zipfile.ZipFile(stream) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or _skipped(info.filename):
+                    continue
+                name = f"{archive}/{info.filename}"
+                error = budget.check(info.file_size)
+                if error:
+                    yield name, None, error
+                    if budget.exhausted:
+                        return
+                    continue
+                # ZipExtFile最多读取声明的大小，并在读完时校验CRC
+                with zf.open(info) as member:
+                    data = member.read()
+                budget.consume(len(data))
+                yield name, data, ""
+
+    def _tar_members(self, archive: str, stream) -> Iterator[Tuple[str, Optional[bytes], str]]:
+        """按顺序流式读取tar中的普通文件（自动识别gzip/bz2/xz压缩）"""
+        budget = _Budget()
+        with tarfile.open(fileobj=stream, mode='r|*') as tf:
+            for info in tf:
+                if not info.isfile() or _skipped(info.name):
+                    continue
+                name = f"{archive}/{info.name}"
+                error = budget.check(info.size)
+                if error:
+                    yield name, None, error
+                    if budget.exhausted:
+                        return
+                    continue
+                data = tf.extractfile(info).read()
+                budget.consume(len(data))
+                yield name, data, ""
+
+    def run(self, uploads: List[tuple], batch_size: Optional[int] = None) -> Iterator[dict]:
+        """
+        批量检测上传的图片
+
+        图片按上传顺序校验并解码，凑满batch_size张后一次前向推理（配置了执行器时交给执行器凑批），
+        命中结果缓存的图片不参与推理；每批完成后按原顺序产出该批的结果
+
+        Args:
+            uploads: take_uploads的返回值（图片或图片压缩包）
+            batch_size: 每次前向推理的图片数，如果为None则使用AppConfig.batch_size；不超过服务计划的最大批大小
+                （YOLOConfig.batch_max_size），凑批期间已解码的图片和预处理缓冲区都以此为上限
+
+        Yields:
+            每张图片一个结果字典：index、filename、success，成功时包含detections、detection_count、
+            image_size、cached，失败时包含message
+        """
+        limit = max(config.yolo.batch_max_size, 1)
+        batch_size = min(max(int(batch_size or config.app.batch_size or limit), 1), limit)
+        pending = []  # 当前批次的(结果字典, 原图, 缓存键)，原图为None表示已有结果
+        images = 0
+        try:
+            for index, (name, data, error) in enumerate(self.iter_images(uploads)):
+                item = {'index': index, 'filename': name}
+                im0, key = None, None
+                if not error:
+                    error, im0, key, cached = self._prepare(data, name)
+                    if cached is not None:
+                        item.update(self._format(cached, cached=True))
+                if error:
+                    item.update({'success': False, 'message': error})
+                pending.append((item, im0, key))
+                images += im0 is not None
+
+                if images >= batch_size:
+                    yield from self._flush(pending, batch_size)
+                    pending, images = [], 0
+            yield from self._flush(pending, batch_size)
+        finally:
+            self.release(uploads)
+
+    def _prepare(self, data, name: str) -> tuple:
+        """
+        校验并解码一张图片
+
+        Returns:
+            (错误消息, 原图, 缓存键, 缓存结果)，命中缓存时不解码
+        """
+        if len(data) > config.app.max_upload_size_mb * 1024 * 1024:
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='size')
+            return f"文件过大 ({len(data) / (1024 * 1024):.2f}MB)，最大允许 {config.app.max_upload_size_mb}MB", \
+                None, None, None
+        if not file_manager.validate_file_type(name):
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='extension')
+            return f"不支持的文件类型: {PurePosixPath(name).name}", None, None, None
+        ok, error = validate_content(data, kinds={'image'})
+        if not ok:
+            return error, None, None, None
+
+        key = None
+        if result_cache.enabled:
+            key = result_cache.make_key(data, self.detector.config)
+            cached = result_cache.get(key, require_image=False)
+            if cached is not None:
+                return "", None, None, cached
+
+        with stage_timer('decode'):
+            im0 = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if im0 is None:
+            return "图片解码失败", None, None, None
+        return "", im0, key, None
+
+    def _flush(self, pending: List[tuple], batch_size: int) -> Iterator[dict]:
+        """推理当前批次中待检测的图片，按原顺序产出全部结果"""
+        images = [im0 for _, im0, _ in pending if im0 is not None]
+        dets = []
+        if images:
+            start = time.perf_counter()
+            try:
+                dets = self.detector.infer_many(images, batch_size)
+            except Exception as e:
+                self.logger.error(f"批量推理失败: {e}")
+                dets = [e] * len(images)
+            self.logger.info(f"批量推理 {len(images)} 张图片，耗时 {(time.perf_counter() - start) * 1E3:.1f}ms")
+
+        dets = iter(dets)
+        for item, im0, key in pending:
+            if im0 is not None:
+                det = next(dets)
+                if isinstance(det, Exception):
+                    item.update({'success': False, 'message': f"目标检测失败: {det}"})
+                else:
+                    result = self.detector.build_result(im0, det, render=False)
+                    if key is not None:
+                        result_cache.put(key, dict(result))
+                    item.update(self._format(result, cached=False))
+            BATCH_IMAGES_TOTAL.inc(result='ok' if item['success'] else 'error')
+            yield item
+
+    @staticmethod
+    def _format(result: dict, cached: bool) -> dict:
+        """检测结果字典转换为接口返回的字段"""
+        h, w = result['shape']
+        return {
+            'success': True,
+            'detections': result['detections'],
+            'detection_count': len(result['detections']),
+            'image_size': [w, h],
+            'cached': cached
+        }
+
+
+class _Budget:
+    """压缩包展开的大小预算：单个成员不超过max_upload_size_mb，合计不超过batch_max_extract_mb"""
+
+    def __init__(self):
+        self.member_limit = config.app.max_upload_size_mb * 1024 * 1024
+        self.remaining = config.app.batch_max_extract_mb * 1024 * 1024
+        self.exhausted = False
+
+    def check(self, size: int) -> str:
+        """检查即将读取的成员大小，超限时返回错误消息"""
+        if size > self.member_limit:
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='size')
+            return f"文件过大 ({size / (1024 * 1024):.2f}MB)，最大允许 {config.app.max_upload_size_mb}MB"
+        if size > self.remaining:
+            self.exhausted = True
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='archive')
+            return f"压缩包解压后超过 {config.app.batch_max_extract_mb}MB，其余文件未处理"
+        return ""
+
+    def consume(self, size: int):
+        self.remaining -= size
+
+
+def _skipped(name: str) -> bool:
+    """跳过隐藏文件和macOS压缩时附带的元数据目录"""
+    return any(part.startswith('.') or part == '__MACOSX' for part in PurePosixPath(name).parts)
+
+
+# 全局批量检测器实例
+batch_detector = BatchDetector()
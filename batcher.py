@@ -0,0 +1,121 @@
+"""
+动态微批处理调度模块
+在YOLODetector前面排队并发请求，凑批后统一执行一次前向推理
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import numpy as np
+
+from config import config
+from detector import YOLODetector, detector
+
+
+def collect_batch(q, max_batch_size: int, max_wait: float) -> list:
+    """
+    阻塞等待第一个请求，然后在等待窗口内尽量凑满一批
+
+    Args:
+        q: 请求队列（queue.Queue或multiprocessing.Queue）
+        max_batch_size: 单批最大请求数
+        max_wait: 从收到第一个请求起的最长等待时间（秒）
+
+    Returns:
+        请求列表，遇到None（停止信号）时将其作为最后一项返回
+    """
+    batch = [q.get()]
+    deadline = time.monotonic() + max_wait
+
+    while len(batch) < max_batch_size and batch[-1] is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(q.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return batch
+
+
+class BatchScheduler:
+    """微批处理调度器类"""
+
+    def __init__(self, yolo_detector: Optional[YOLODetector] = None,
+                 max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        """
+        初始化调度器
+
+        Args:
+            yolo_detector: 执行推理的检测器，如果为None则使用全局检测器
+            max_batch_size: 单批最大图片数，如果为None则使用配置中的值
+            max_wait_ms: 凑批最长等待时间（毫秒），如果为None则使用配置中的值
+        """
+        self.detector = yolo_detector or detector
+        self.max_batch_size = max_batch_size or config.yolo.batch_max_size
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else config.yolo.batch_max_wait_ms) / 1000
+        self.logger = logging.getLogger(__name__)
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用微批处理"""
+        return self.max_batch_size > 1
+
+    @property
+    def queue_depth(self) -> int:
+        """等待凑批的请求数"""
+        return self._queue.qsize()
+
+    def start(self):
+        """启动后台批处理线程（重复调用无副作用）"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+                self._thread.start()
+                self.logger.info(f"微批处理已启动: max_batch_size={self.max_batch_size}, "
+                                 f"max_wait={self.max_wait * 1E3:.1f}ms")
+
+    def submit(self, im0: np.ndarray) -> Future:
+        """
+        提交一张已解码的图片等待批量推理
+
+        Args:
+            im0: BGR格式的原图
+
+        Returns:
+            Future对象，结果为该图片的检测结果张量
+        """
+        self.start()
+        future = Future()
+        self._queue.put((im0, future))
+        return future
+
+    def _run(self):
+        """后台批处理循环"""
+        while True:
+            batch = collect_batch(self._queue, self.max_batch_size, self.max_wait)
+            images = [im0 for im0, _ in batch]
+
+            try:
+                results = self.detector.infer_batch(images)
+            except Exception as e:
+                self.logger.error(f"批量推理失败: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), det in zip(batch, results):
+                future.set_result(det)
+
+            self.logger.debug(f"批量推理完成: batch_size={len(batch)}")
+
+
+# 全局批处理调度器实例
+batch_scheduler = BatchScheduler()
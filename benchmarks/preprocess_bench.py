@@ -0,0 +1,114 @@
+"""
+预处理微基准
+对比原预处理流程（letterbox + 转置拷贝 + from_numpy + 类型转换 + 除以255）
+与服务计划预处理器（写入预分配缓冲区、融合归一化）的单帧耗时和内存分配量
+
+用法:
+    python benchmarks/preprocess_bench.py --frame 1080x1920 --batch 1 --runs 100
+"""
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.augmentations import letterbox
+
+from serving import Preprocessor
+
+
+def baseline(images, imgsz, stride, device, fp16, auto):
+    """原预处理流程：数据加载器内letterbox和转置，推理前再转换类型并归一化"""
+    batch = np.stack([
+        np.ascontiguousarray(letterbox(im0, imgsz, stride=stride, auto=auto)[0].transpose((2, 0, 1))[::-1])
+        for im0 in images
+    ])
+    im = torch.from_numpy(batch).to(device)
+    im = im.half() if fp16 else im.float()
+    im /= 255
+    return im
+
+
+def measure(fn, runs: int) -> dict:
+    """
+    统计单帧耗时和内存分配
+
+    Args:
+        fn: 执行一次预处理的函数
+        runs: 计时次数
+
+    Returns:
+        耗时中位数/平均值（毫秒）、numpy峰值分配（MB）、torch分配总量（MB）
+    """
+    fn()  # 首次调用包含缓冲区初始化等开销，不计入
+    times = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - t) * 1E3)
+
+    # numpy数组的分配由tracemalloc跟踪
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    fn()
+    _, numpy_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # torch张量的分配由profiler统计
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    torch_bytes = sum(e.self_cpu_memory_usage for e in prof.key_averages() if e.self_cpu_memory_usage > 0)
+
+    return {
+        'median_ms': statistics.median(times),
+        'mean_ms': statistics.mean(times),
+        'numpy_peak_mb': numpy_peak / 1024 / 1024,
+        'torch_alloc_mb': torch_bytes / 1024 / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预处理微基准')
+    parser.add_argument('--frame', default='1080x1920', help='输入帧尺寸 高x宽')
+    parser.add_argument('--imgsz', type=int, default=640, help='模型输入尺寸')
+    parser.add_argument('--batch', type=int, default=1, help='批大小')
+    parser.add_argument('--runs', type=int, default=100, help='计时次数')
+    parser.add_argument('--auto', action='store_true', help='按步长取最小矩形（视频路径的行为）')
+    parser.add_argument('--device', default='cpu', help='cpu 或 cuda')
+    parser.add_argument('--half', action='store_true', help='半精度输入')
+    opt = parser.parse_args()
+
+    h, w = (int(x) for x in opt.frame.split('x'))
+    imgsz, stride, device = (opt.imgsz, opt.imgsz), 32, torch.device(opt.device)
+    rng = np.random.default_rng(0)
+    images = [rng.integers(0, 255, (h, w, 3), dtype=np.uint8) for _ in range(opt.batch)]
+
+    preprocessor = Preprocessor(imgsz, stride, device, opt.half, max_batch_size=opt.batch)
+
+    def optimized():
+        with preprocessor.acquire() as slot:
+            return preprocessor.fill(slot, images, auto=opt.auto)
+
+    assert torch.equal(baseline(images, imgsz, stride, device, opt.half, opt.auto), optimized()), '两种预处理结果不一致'
+
+    print(f"输入 {opt.batch}x{h}x{w}, 模型输入 {imgsz}, auto={opt.auto}, device={device}, half={opt.half}")
+    print(f"{'':<12}{'中位数(ms)':>12}{'平均(ms)':>12}{'numpy峰值(MB)':>16}{'torch分配(MB)':>16}")
+    for name, fn in (('baseline', lambda: baseline(images, imgsz, stride, device, opt.half, opt.auto)),
+                     ('optimized', optimized)):
+        r = measure(fn, opt.runs)
+        print(f"{name:<12}{r['median_ms']:>12.2f}{r['mean_ms']:>12.2f}{r['numpy_peak_mb']:>16.2f}{r['torch_alloc_mb']:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+检测框绘制微基准
+对比逐框调用YOLOv5 Annotator.box_label与批量绘制器BoxRenderer在不同检测框数量下的耗时
+
+用法:
+    python benchmarks/render_bench.py --frame 1080x1920 --boxes 10 100 1000 --runs 20
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from utils.plots import Annotator, colors
+
+from render import BoxRenderer
+
+# COCO前若干类，覆盖带下伸字母和较长的类别名
+NAMES = dict(enumerate(['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat',
+                        'traffic light', 'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat']))
+
+
+def make_detections(n: int, h: int, w: int, rng: np.random.Generator) -> torch.Tensor:
+    """生成n个随机检测框，按置信度从高到低排列（与NMS输出一致）"""
+    x1, y1 = rng.integers(0, w - 20, n), rng.integers(0, h - 20, n)
+    x2 = np.minimum(x1 + rng.integers(10, w // 4, n), w - 1)
+    y2 = np.minimum(y1 + rng.integers(10, h // 4, n), h - 1)
+    det = np.stack([x1, y1, x2, y2, rng.uniform(0.25, 1, n), rng.integers(0, len(NAMES), n)], 1)
+    return torch.tensor(det[np.argsort(-det[:, 4])], dtype=torch.float32)
+
+
+def annotator(im: np.ndarray, det: torch.Tensor, line_width: int) -> np.ndarray:
+    """原绘制方式：逐框格式化标签并调用box_label"""
+    ann = Annotator(im, line_width=line_width, example=str(NAMES))
+    for *xyxy, conf, cls in reversed(det):
+        c = int(cls)
+        ann.box_label(xyxy, f'{NAMES[c]} {conf:.2f}', color=colors(c, True))
+    return ann.result()
+
+
+def measure(fn, base: np.ndarray, runs: int) -> float:
+    """在原图副本上重复绘制，返回耗时中位数（毫秒，不含复制原图）"""
+    times = []
+    for _ in range(runs):
+        im = base.copy()
+        t = time.perf_counter()
+        fn(im)
+        times.append((time.perf_counter() - t) * 1E3)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='检测框绘制微基准')
+    parser.add_argument('--frame', default='1080x1920', help='图片尺寸 高x宽')
+    parser.add_argument('--boxes', type=int, nargs='+', default=[10, 100, 1000], help='检测框数量')
+    parser.add_argument('--line-width', type=int, default=3, help='线宽')
+    parser.add_argument('--runs', type=int, default=20, help='计时次数')
+    opt = parser.parse_args()
+
+    h, w = (int(x) for x in opt.frame.split('x'))
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+    renderer = BoxRenderer(NAMES, opt.line_width)
+
+    print(f"图片 {h}x{w}, 线宽 {opt.line_width}, 每项 {opt.runs} 次取中位数")
+    print(f"{'框数':>6}{'Annotator(ms)':>16}{'BoxRenderer冷缓存(ms)':>24}{'BoxRenderer(ms)':>18}{'加速比':>10}")
+    for n in opt.boxes:
+        det = make_detections(n, h, w, rng)
+        t_ann = measure(lambda im: annotator(im, det, opt.line_width), base, opt.runs)
+        renderer._glyphs.clear()
+        t_cold = measure(lambda im: renderer.render(im, det), base, 1)
+        t_warm = measure(lambda im: renderer.render(im, det), base, opt.runs)
+        print(f"{n:>6}{t_ann:>16.2f}{t_cold:>24.2f}{t_warm:>18.2f}{t_ann / t_warm:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
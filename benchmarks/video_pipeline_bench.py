@@ -0,0 +1,127 @@
+"""
+视频流水线基准
+对比逐帧串行处理与解码/推理/绘制流水线处理同一视频的总耗时，并输出流水线各阶段的利用率；
+指定--motion-thresholds时另外对比不同运动门控阈值下的吞吐、推理帧占比以及与逐帧推理结果的一致率
+
+用法:
+    python benchmarks/video_pipeline_bench.py --source video.mp4 --batch-sizes 1 4 8
+    python benchmarks/video_pipeline_bench.py --frames 120 --frame 720x1280   # 生成合成视频
+    python benchmarks/video_pipeline_bench.py --source video.mp4 --motion-thresholds 0.002 0.01 0.05
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import torch
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from config import config
+from detector import YOLODetector
+from storage import result_store
+from utils.metrics import box_iou
+
+
+def make_video(path: Path, frames: int, h: int, w: int) -> Path:
+    """生成带移动色块的合成视频"""
+    rng = np.random.default_rng(0)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 25, (w, h))
+    base = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+    for i in range(frames):
+        im = base.copy()
+        x = (i * 7) % (w - 100)
+        cv2.rectangle(im, (x, h // 3), (x + 100, h // 3 + 160), (40, 80, 200), -1)
+        writer.write(im)
+    writer.release()
+    return path
+
+
+def run(detector: YOLODetector, source: Path, pipeline: bool, batch_size: int, render: bool,
+        save_dir: Path, frames: list = None) -> tuple:
+    """处理一遍视频，返回(总耗时秒, 帧数)，frames不为None时收集逐帧结果"""
+    detector.config.video_pipeline = pipeline
+    detector.config.pipeline_batch_size = batch_size
+    frames = [] if frames is None else frames
+    t = time.perf_counter()
+    detector.detect_frames(source, save_dir, frame_callback=frames.append, render=render)
+    return time.perf_counter() - t, len(frames)
+
+
+def agreement(reference: list, frames: list, iou_thres: float = 0.5) -> float:
+    """逐帧推理的目标中，在门控结果的同一帧里有同类且IoU不低于iou_thres的目标的比例"""
+    matched = total = 0
+    for ref, out in zip(reference, frames):
+        total += len(ref['detections'])
+        if not ref['detections'] or not out['detections']:
+            continue
+        iou = box_iou(torch.tensor([d['xyxy'] for d in ref['detections']]),
+                      torch.tensor([d['xyxy'] for d in out['detections']]))
+        same = torch.tensor([d['class_id'] for d in ref['detections']])[:, None] == \
+            torch.tensor([d['class_id'] for d in out['detections']])[None]
+        matched += int(((iou >= iou_thres) & same).any(1).sum())
+    return matched / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频流水线基准')
+    parser.add_argument('--weights', type=str, default=config.yolo.weights, help='模型权重路径')
+    parser.add_argument('--source', type=str, default=None, help='视频路径，不指定时生成合成视频')
+    parser.add_argument('--frames', type=int, default=60, help='合成视频的帧数')
+    parser.add_argument('--frame', default='720x1280', help='合成视频的尺寸 高x宽')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4], help='流水线推理阶段的批大小')
+    parser.add_argument('--no-render', action='store_true', help='不绘制和写出结果视频')
+    parser.add_argument('--motion-thresholds', type=float, nargs='*', default=[], help='对比的运动门控阈值')
+    parser.add_argument('--motion-reuse', default=config.yolo.motion_reuse, help="跳过帧的结果：'hold' 或 'linear'")
+    opt = parser.parse_args()
+
+    config.yolo.weights = opt.weights
+    detector = YOLODetector(config.yolo)
+    if not detector.load_model():
+        sys.exit('模型加载失败')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # 结果目录登记到临时索引，不写入服务使用的 instance/results.db（否则计入保留策略的容量）
+        result_store.index_path = Path(tmp) / 'results.db'
+        source = Path(opt.source) if opt.source else \
+            make_video(Path(tmp) / 'synthetic.mp4', opt.frames, *(int(x) for x in opt.frame.split('x')))
+        render = not opt.no_render
+        save_dir = Path(tmp) / 'results'
+        run(detector, source, False, 1, False, save_dir)  # 预热解码器和模型
+
+        serial, n = run(detector, source, False, 1, render, save_dir)
+        print(f"视频 {source.name}, {n} 帧, {'绘制并写出结果' if render else '只检测'}")
+        print(f"{'模式':<14}{'总耗时(s)':>12}{'FPS':>10}{'加速比':>10}  阶段利用率")
+        print(f"{'串行':<14}{serial:>12.2f}{n / serial:>10.2f}{1:>10.2f}x")
+        for batch_size in opt.batch_sizes:
+            seconds, n = run(detector, source, True, batch_size, render, save_dir)
+            stats = detector.last_pipeline_stats
+            usage = ', '.join(f"{name} {stats[name]['utilization']:.0%}" for name in ('decode', 'infer', 'sink'))
+            print(f"{f'流水线 batch={batch_size}':<14}{seconds:>12.2f}{n / seconds:>10.2f}{serial / seconds:>10.2f}x  {usage}")
+
+        if opt.motion_thresholds:
+            batch_size = opt.batch_sizes[-1]
+            reference = []
+            baseline, n = run(detector, source, True, batch_size, render, save_dir, reference)
+            print(f"\n运动门控（流水线 batch={batch_size}, {opt.motion_reuse}）")
+            print(f"{'阈值':<14}{'总耗时(s)':>12}{'FPS':>10}{'加速比':>10}{'推理帧':>10}{'一致率':>10}")
+            print(f"{'关闭':<14}{baseline:>12.2f}{n / baseline:>10.2f}{1:>10.2f}x{1:>10.0%}{1:>10.0%}")
+            detector.config.motion_gating = True
+            detector.config.motion_reuse = opt.motion_reuse
+            for threshold in opt.motion_thresholds:
+                detector.config.motion_threshold = threshold
+                frames = []
+                seconds, n = run(detector, source, True, batch_size, render, save_dir, frames)
+                fraction = detector.last_pipeline_stats['inferred_fraction']
+                print(f"{threshold:<14g}{seconds:>12.2f}{n / seconds:>10.2f}{baseline / seconds:>10.2f}x"
+                      f"{fraction:>10.0%}{agreement(reference, frames):>10.0%}")
+            detector.config.motion_gating = False
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""
+检测结果缓存模块
+按上传内容哈希和检测参数缓存检测结果，重复提交的图片无需再次推理
+"""
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from pathlib import Path
+from typing import Optional
+
+from config import config, CacheConfig, YOLOConfig
+
+# 影响检测结果或渲染图片的YOLO配置字段
+KEY_FIELDS = (
+    'weights', 'imgsz', 'conf_thres', 'iou_thres', 'classes', 'agnostic_nms', 'max_det', 'augment',
+    'line_thickness', 'hide_labels', 'hide_conf', 'renderer'
+)
+
+
+class ResultCache:
+    """检测结果缓存类（内存LRU + 可选磁盘层）"""
+
+    def __init__(self, cache_config: Optional[CacheConfig] = None):
+        """
+        初始化缓存
+
+        Args:
+            cache_config: 缓存配置对象，如果为None则使用默认配置
+        """
+        self.config = cache_config or config.cache
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (entry, 字节数)
+        self._memory_bytes = 0
+        self._memory_limit = int(self.config.memory_max_mb * 1024 * 1024)
+
+        self._disk_dir = Path(self.config.disk_dir) if self.config.disk_dir else None
+        self._disk = OrderedDict()  # key -> 字节数，按最近使用排序
+        self._disk_bytes = 0
+        self._disk_limit = int(self.config.disk_max_mb * 1024 * 1024)
+        if self.enabled and self._disk_dir:
+            self._load_disk_index()
+
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用缓存"""
+        return self.config.enabled
+
+    @staticmethod
+    def make_key(data: bytes, yolo_config: YOLOConfig, content_hash=None) -> str:
+        """
+        计算缓存键
+
+        Args:
+            data: 上传文件的原始字节
+            yolo_config: 检测使用的YOLO配置（结果图片编码参数取自全局配置）
+            content_hash: 接收上传时已累计的sha256哈希对象，提供时不再重新计算data的哈希
+
+        Returns:
+            内容哈希与检测参数共同决定的缓存键
+        """
+        params = {f: getattr(yolo_config, f) for f in KEY_FIELDS}
+        params['encode'] = asdict(config.encode)  # 编码参数决定缓存的结果图片
+        params = json.dumps(params, sort_keys=True, default=str)
+        h = content_hash.copy() if content_hash is not None else hashlib.sha256(data)
+        h.update(params.encode())
+        return h.hexdigest()
+
+    def get(self, key: str, require_image: bool = False) -> Optional[dict]:
+        """
+        查询缓存
+
+        Args:
+            key: 缓存键
+            require_image: 是否需要渲染后的结果图片，缓存条目没有图片时视为未命中
+
+        Returns:
+            缓存的检测结果字典（detections、shape、image、ext、encode、save_path、variants），未命中时返回None
+        """
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and (item[0]['image'] is not None or not require_image):
+                self._memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return item[0]
+
+        entry = self._read_disk(key) if item is None else None
+        with self._lock:
+            if entry is None or (entry['image'] is None and require_image):
+                self.misses += 1
+                return None
+            self.hits['disk'] += 1
+            self._put_memory(key, entry)
+            return entry
+
+    def put(self, key: str, entry: dict):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            entry: 检测结果字典，image为编码后的结果图片（可为None）
+        """
+        with self._lock:
+            self._put_memory(key, entry)
+        if self._disk_dir:
+            self._write_disk(key, entry)
+
+    def stats(self) -> dict:
+        """缓存命中统计"""
+        with self._lock:
+            hits = self.hits['memory'] + self.hits['disk']
+            total = hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': hits,
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'hit_rate': round(hits / total, 4) if total else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes
+            }
+
+    def _put_memory(self, key: str, entry: dict):
+        """写入内存层并按容量淘汰最久未使用的条目（调用方持有锁）"""
+        size = len(entry.get('image') or b'') + 64 * len(entry['detections']) + 256
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        if size > self._memory_limit:
+            return
+
+        self._memory[key] = (entry, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self._memory_limit:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted
+
+    def _disk_paths(self, key: str):
+        """缓存条目在磁盘上的元数据和图片路径"""
+        shard = self._disk_dir / key[:2]
+        return shard / f'{key}.json', shard / f'{key}.img'
+
+    def _load_disk_index(self):
+        """启动时扫描一次磁盘层，按修改时间恢复LRU顺序"""
+        entries = []
+        for meta_path in self._disk_dir.glob('*/*.json'):
+            img_path = meta_path.with_suffix('.img')
+            size = meta_path.stat().st_size + (img_path.stat().st_size if img_path.exists() else 0)
+            entries.append((meta_path.stat().st_mtime, meta_path.stem, size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self.logger.info(f"磁盘缓存已加载: {len(self._disk)} 条, {self._disk_bytes / 1024 / 1024:.1f}MB")
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        """从磁盘层读取缓存条目"""
+        if not self._disk_dir:
+            return None
+        with self._lock:
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+
+        meta_path, img_path = self._disk_paths(key)
+        try:
+            entry = json.loads(meta_path.read_text(encoding='utf-8'))
+            entry['shape'] = tuple(entry['shape'])
+            entry['image'] = img_path.read_bytes() if img_path.exists() else None
+            if entry.get('save_path'):
+                entry['save_path'] = Path(entry['save_path'])
+            return entry
+        except Exception as e:
+            self.logger.warning(f"读取磁盘缓存失败: {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, entry: dict):
+        """写入磁盘层并按总大小淘汰最久未使用的条目"""
+        meta_path, img_path = self._disk_paths(key)
+        try:
+            meta_path.parent.mkdir(parents=True, exist_ok=True)
+            meta = {
+                'detections': entry['detections'],
+                'shape': list(entry['shape']),
+                'ext': entry.get('ext'),
+                'encode': entry.get('encode'),
+                'variants': entry.get('variants'),
+                'save_path': str(entry['save_path']) if entry.get('save_path') else None
+            }
+            meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+            size = meta_path.stat().st_size
+            if entry.get('image'):
+                img_path.write_bytes(entry['image'])
+                size += len(entry['image'])
+            else:
+                img_path.unlink(missing_ok=True)
+        except Exception as e:
+            self.logger.warning(f"写入磁盘缓存失败: {key}: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            while self._disk_bytes > self._disk_limit and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            for path in self._disk_paths(old_key):
+                path.unlink(missing_ok=True)
+
+
+# 全局结果缓存实例
+result_cache = ResultCache()
@@ -31,9 +31,56 @@ class YOLOConfig:
     line_thickness: int = 3
     hide_labels: bool = False
     hide_conf: bool = False
+    # 检测框绘制方式：'batched'（按颜色批量绘制框线并缓存标签图块）或 'annotator'（逐框调用YOLOv5 Annotator）；
+    # 类别名称含非ASCII字符时始终使用Annotator（需PIL绘制）
+    renderer: str = 'batched'
     half: bool = False
     dnn: bool = False
     vid_stride: int = 1
+    # 视频流水线：解码、推理、绘制编码分线程并行（摄像头/截屏输入和visualize模式不使用），
+    # pipeline_batch_size为推理阶段一次合并的连续帧数上限，pipeline_queue_size为阶段间队列容量（帧）
+    video_pipeline: bool = True
+    pipeline_batch_size: int = 4
+    pipeline_queue_size: int = 8
+    # 运动门控（视频流水线）：缩略图（motion_size像素宽）中灰度变化超过motion_pixel_delta的像素比例
+    # 达到motion_threshold时才推理，否则沿用上次推理的结果（motion_reuse='hold'）或线性外推边界框（'linear'），
+    # 连续跳过motion_max_skip帧后强制推理一次；阈值越大、可跳过的帧越多，吞吐越高，检测结果越滞后
+    motion_gating: bool = False
+    motion_threshold: float = 0.005
+    motion_pixel_delta: int = 20
+    motion_max_skip: int = 15
+    motion_size: int = 160
+    motion_reuse: str = 'hold'
+    # 目标跟踪（SORT风格：卡尔曼滤波+IoU匹配）：视频和摄像头的检测结果带track_id；detect_interval>1时每隔
+    # detect_interval帧推理一次，中间帧由跟踪器推算边界框（同时启用运动门控时跳过帧也由跟踪器推算）；
+    # track_max_age为轨迹连续未匹配到检测后保留的帧数，track_iou_thres为检测与轨迹匹配的最小IoU
+    tracker: bool = False
+    detect_interval: int = 1
+    track_max_age: int = 30
+    track_iou_thres: float = 0.3
+    # 动态微批处理：单批最大图片数与凑批最长等待时间（毫秒），batch_max_size<=1时关闭
+    batch_max_size: int = 8
+    batch_max_wait_ms: float = 5.0
+    # 多进程推理：工作进程数（0表示在Web进程内推理）、每进程PyTorch线程数、单请求超时（秒）
+    num_workers: int = 0
+    worker_threads: int = 1
+    worker_timeout: float = 60.0
+    # 线程配置（加载模型时生效）：intra-op/inter-op线程数（0表示使用PyTorch默认值）、
+    # 绑定的CPU编号列表、本进程同时执行的推理数上限（0表示不限制）
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    cpu_affinity: Optional[list] = None
+    max_concurrent_inference: int = 0
+    # 使用CUDA时预处理画布是否使用锁页内存，以便异步拷贝到显存
+    pin_memory: bool = True
+    # 启动预热：加载模型时对每种服务输入形状执行一次前向推理，之后不再逐请求预热。
+    # warmup_batch_sizes为固定尺寸推理（尺寸不同的图片合批）的批大小列表（None表示1到batch_max_size），
+    # warmup_shapes为额外预热的输入尺寸(h, w)列表（批大小1），如视频常见的(384, 640)和640x480图片的(480, 640)
+    warmup: bool = True
+    warmup_batch_sizes: Optional[list] = None
+    warmup_shapes: Optional[list] = None
+    # 启动自测：加载模型后执行的基准推理次数，0表示跳过
+    startup_benchmark_runs: int = 5
 
 
 @dataclass
@@ -54,6 +101,20 @@ class AppConfig:
     # 结果文件URL前缀，用于生成可访问的结果文件URL
     results_url_prefix: str = 'static/images'
     allowed_extensions: set = None
+    # 异步检测任务：同时运行的任务数上限，以及内存中保留的任务记录数
+    max_video_jobs: int = 2
+    max_job_history: int = 200
+    # 流式检测：逐帧结果的缓冲帧数，客户端读取跟不上时检测线程等待
+    stream_queue_frames: int = 256
+    # 图片像素尺寸上限：总像素数（防止解压炸弹）和单边长度，按文件头探测，超出时不解码直接拒绝
+    max_image_pixels: int = 40_000_000
+    max_image_side: int = 16384
+    # 批量检测接口：单个请求的图片数上限（含压缩包内的图片）、请求体大小上限（MB）、
+    # 压缩包解压后的总大小上限（MB），以及每次前向推理的图片数（0表示使用YOLOConfig.batch_max_size，且不超过该值）
+    batch_max_files: int = 1000
+    batch_max_upload_mb: int = 512
+    batch_max_extract_mb: int = 2048
+    batch_size: int = 0
     
     def __post_init__(self):
         if self.allowed_extensions is None:
@@ -70,6 +131,61 @@ class AppConfig:
             self.max_content_length = self.max_upload_size_mb * 1024 * 1024
 
 
+@dataclass
+class CacheConfig:
+    """检测结果缓存配置类"""
+    enabled: bool = True
+    # 内存LRU层容量（MB）
+    memory_max_mb: float = 64
+    # 磁盘层目录，为None时不启用磁盘层
+    disk_dir: Optional[str] = None
+    # 磁盘层容量（MB），超出后淘汰最久未使用的条目
+    disk_max_mb: float = 1024
+
+
+@dataclass
+class RetentionConfig:
+    """文件保留策略配置类"""
+    enabled: bool = True
+    # 后台清理间隔（秒）
+    interval_seconds: int = 600
+    # 结果、原图和上传文件的最长保留时间（小时）
+    max_age_hours: float = 24
+    # 保留文件的总大小上限（MB），超出后从最早的文件开始删除
+    max_total_mb: float = 2048
+
+
+@dataclass
+class MemoryConfig:
+    """内存管理策略配置类"""
+    enabled: bool = True
+    # 检查内存水位的间隔（秒）
+    check_interval_seconds: float = 10
+    # 无论水位如何都执行一次回收的间隔（秒），0表示只按水位回收
+    collect_interval_seconds: float = 600
+    # 进程常驻内存（RSS）高水位（MB），超过后执行回收，0表示不检查
+    rss_high_mb: float = 0
+    # CUDA缓存显存高水位（MB），超过后释放缓存显存，0表示不检查
+    vram_high_mb: float = 0
+    # 两次水位触发的回收之间的最短间隔（秒），防止内存持续偏高时反复回收
+    min_collect_gap_seconds: float = 30
+
+
+@dataclass
+class EncodeConfig:
+    """结果图片编码配置类"""
+    # 输出格式：'jpeg'、'webp'，或'source'（与上传图片格式相同，无法写出时使用jpeg）
+    format: str = 'jpeg'
+    # JPEG/WebP编码质量（1-100）
+    quality: int = 85
+    # 输出图片最长边（像素），超出时编码前等比缩小，0表示保持原尺寸
+    max_dimension: int = 0
+    # 保存结果时额外生成的缩小版本（最长边像素），页面和API按显示尺寸选用；为空时只保存原尺寸
+    variant_sizes: Tuple[int, ...] = (256, 1024)
+    # JPEG编码后端：'auto'（安装了PyTurboJPEG时使用libjpeg-turbo）、'turbojpeg' 或 'opencv'
+    backend: str = 'auto'
+
+
 class Config:
     """主配置类"""
     
@@ -84,6 +200,18 @@ class Config:
         # Flask应用配置
         self.app = AppConfig()
         
+        # 结果缓存配置
+        self.cache = CacheConfig()
+        
+        # 文件保留策略配置
+        self.retention = RetentionConfig()
+        
+        # 内存管理策略配置
+        self.memory = MemoryConfig()
+        
+        # 结果图片编码配置
+        self.encode = EncodeConfig()
+        
         # 目录配置
         self.setup_directories()
         
@@ -96,9 +224,11 @@ class Config:
         self.static_dir = self.ROOT / self.app.static_folder
         self.results_dir = self.static_dir / 'images'
         self.logs_dir = self.ROOT / 'logs'
+        # 不对外提供访问的运行时数据（索引数据库等）
+        self.instance_dir = self.ROOT / 'instance'
         
         # 创建目录
-        for directory in [self.uploads_dir, self.static_dir, self.results_dir, self.logs_dir]:
+        for directory in [self.uploads_dir, self.static_dir, self.results_dir, self.logs_dir, self.instance_dir]:
             directory.mkdir(parents=True, exist_ok=True)
     
     @property
@@ -121,6 +251,11 @@ class Config:
         """日志保存路径"""
         return self.logs_dir
     
+    @property
+    def instance_path(self) -> Path:
+        """运行时数据路径"""
+        return self.instance_dir
+    
     @property
     def static_path(self) -> Path:
         """静态文件路径"""
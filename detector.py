@@ -3,11 +3,14 @@ YOLO检测服务模块
 封装YOLO检测逻辑，提供统一的检测接口
 """
 import logging
-import platform
+import os
 import sys
-import gc
+import threading
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Optional, Union
+from typing import Callable, List, Optional, Union
+import numpy as np
 import torch
 import cv2
 
@@ -21,13 +24,20 @@ from models.common import DetectMultiBackend
 from utils.dataloaders import IMG_FORMATS, VID_FORMATS, LoadImages, LoadScreenshots, LoadStreams
 from utils.general import (
     LOGGER, Profile, check_file, check_img_size, check_imshow, 
-    colorstr, increment_path, non_max_suppression, scale_boxes, 
-    strip_optimizer, xyxy2xywh
+    colorstr, increment_path, non_max_suppression, scale_boxes, xyxy2xywh
 )
-from utils.plots import Annotator, colors, save_one_box
+from utils.plots import Annotator, colors
 from utils.torch_utils import select_device, smart_inference_mode
 
 from config import config, YOLOConfig
+from cache import result_cache
+from encoder import image_encoder
+from metrics import MODEL_LOAD_SECONDS, observe_stage, stage_timer
+from motion import MOTION_FRAMES_TOTAL, BoxPropagator, MotionGate
+from tracker import TrackerSet
+from serving import ServingPlan
+from storage import result_store
+from video_pipeline import VideoPipeline
 
 
 class YOLODetector:
@@ -43,11 +53,32 @@ class YOLODetector:
         self.config = yolo_config or config.yolo
         self.model = None
         self.device = None
+        # 服务计划：输入尺寸、步长、类别名称和预处理器，在load_model时创建
+        self.plan = None
+        # 推理执行器：提供submit(im0) -> Future的对象（如微批处理调度器），为None时在调用线程直接推理
+        self.executor = None
+        # 本进程同时执行的推理数上限，在load_model时按配置创建
+        self._inference_slots = None
+        # 最近一次infer_batch各阶段耗时（秒），供工作进程回传给Web进程
+        self.last_timings = {}
+        # 最近一次视频流水线各阶段的统计（见VideoPipeline.run）
+        self.last_pipeline_stats = {}
+        # 已预热的输入形状 (batch, 3, h, w)，以及模型加载并预热完成的就绪标志
+        self._warmed_shapes = set()
+        self.ready = False
         self.logger = logging.getLogger(__name__)
         
-    def load_model(self):
-        """加载YOLO模型"""
+    def load_model(self, warmup: bool = True):
+        """
+        加载YOLO模型
+        
+        Args:
+            warmup: 是否执行启动预热和自测（仍受warmup、startup_benchmark_runs配置控制）；
+                推理交给工作进程时Web进程的模型只用于视频等进程内路径，不必预热
+        """
         try:
+            t = time.perf_counter()
+            self._apply_threading_profile()
             self.device = select_device(self.config.device)
             self.model = DetectMultiBackend(
                 self.config.weights, 
@@ -56,56 +87,471 @@ class YOLODetector:
                 data=self.config.data, 
                 fp16=self.config.half
             )
+            self.plan = ServingPlan.build(self.model, self.config)
+            MODEL_LOAD_SECONDS.set(time.perf_counter() - t)
             self.logger.info(f"模型加载成功: {self.config.weights}")
+            if warmup and self.config.warmup:
+                self.warmup()
+            if warmup and self.config.startup_benchmark_runs > 0:
+                self._self_benchmark(self.config.startup_benchmark_runs)
+            self.ready = True
             return True
         except Exception as e:
             self.logger.error(f"模型加载失败: {e}")
             return False
     
+    def _apply_threading_profile(self):
+        """按配置设置CPU亲和性、OpenMP/MKL环境变量和PyTorch线程数"""
+        cfg = self.config
+        
+        if cfg.cpu_affinity and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, set(cfg.cpu_affinity))
+        
+        if cfg.intra_op_threads > 0:
+            # 环境变量只对之后初始化的运行时（如子进程、ONNX/OpenVINO后端）生效，已设置的不覆盖
+            for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+                os.environ.setdefault(var, str(cfg.intra_op_threads))
+            torch.set_num_threads(cfg.intra_op_threads)
+        
+        if cfg.inter_op_threads > 0:
+            try:
+                torch.set_num_interop_threads(cfg.inter_op_threads)
+            except RuntimeError as e:
+                # inter-op线程池在首次并行计算后不能再修改
+                self.logger.warning(f"无法设置inter-op线程数: {e}")
+        
+        if cfg.max_concurrent_inference > 0:
+            self._inference_slots = threading.BoundedSemaphore(cfg.max_concurrent_inference)
+        
+        affinity = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None
+        self.logger.info(
+            f"线程配置: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}, "
+            f"CPU亲和性={affinity}, 并发推理上限={cfg.max_concurrent_inference or '不限'}"
+        )
+    
+    def _inference_slot(self):
+        """获取一个推理并发名额，未设置上限时不做限制"""
+        return self._inference_slots or nullcontext()
+    
     @smart_inference_mode()
-    def detect(self, source: Union[str, Path], save_dir: Optional[Path] = None) -> Optional[Path]:
+    def warmup(self):
+        """
+        对服务中会用到的每种输入形状各执行一次前向推理，已预热过的形状不再重复
+        
+        固定尺寸推理（infer_batch）按各批大小预热，warmup_shapes中的额外尺寸按批大小1预热
+        """
+        plan = self.plan
+        batch_sizes = self.config.warmup_batch_sizes or range(1, plan.max_batch_size + 1)
+        shapes = [(bs, 3, *plan.imgsz) for bs in batch_sizes]
+        shapes += [(1, 3, *check_img_size(list(s), s=plan.stride)) for s in self.config.warmup_shapes or ()]
+        
+        t = time.perf_counter()
+        count = 0
+        for shape in shapes:
+            if shape in self._warmed_shapes:
+                continue
+            self.model(torch.zeros(*shape, dtype=plan.preprocessor.dtype, device=self.device))
+            self._warmed_shapes.add(shape)
+            count += 1
+        
+        if count:
+            self.logger.info(f"模型预热完成: {count} 种输入形状, 耗时 {(time.perf_counter() - t) * 1E3:.1f}ms")
+    
+    @smart_inference_mode()
+    def _self_benchmark(self, runs: int):
+        """用空白输入执行若干次前向推理，记录当前线程配置下的推理延迟"""
+        imgsz = self.plan.imgsz
+        im = torch.zeros(1, 3, *imgsz, dtype=self.plan.preprocessor.dtype, device=self.device)
+        
+        if (1, 3, *imgsz) not in self._warmed_shapes:
+            self.model(im)  # 首次推理包含初始化开销，不计入统计
+        times = []
+        for _ in range(runs):
+            t = time.perf_counter()
+            self.model(im)
+            times.append((time.perf_counter() - t) * 1E3)
+        
+        times.sort()
+        self.logger.info(
+            f"启动自测: {runs} 次推理, 输入 {(1, 3, *imgsz)}, "
+            f"平均 {sum(times) / runs:.1f}ms, 中位数 {times[runs // 2]:.1f}ms, 最慢 {times[-1]:.1f}ms"
+        )
+    
+    @smart_inference_mode()
+    def detect(self, source: Union[str, Path], save_dir: Optional[Path] = None,
+               progress_callback: Optional[Callable[[int, int], None]] = None) -> Optional[Path]:
         """
         执行目标检测
         
         Args:
             source: 输入源路径
-            save_dir: 保存目录，如果为None则使用默认目录
+            save_dir: 结果根目录，如果为None则使用默认目录
+            progress_callback: 进度回调，每处理完一帧调用一次，参数为(已处理帧数, 总帧数)
             
         Returns:
             检测结果保存路径，失败时返回None
         """
         try:
-            if self.model is None:
-                if not self.load_model():
-                    return None
+            return self.detect_frames(source, save_dir, progress_callback)
             
-            source = str(source)
-            save_dir = save_dir or config.results_path
+        except Exception as e:
+            self.logger.error(f"检测过程中发生错误: {e}")
+            return None
+    
+    @smart_inference_mode()
+    def detect_frames(self, source: Union[str, Path], save_dir: Optional[Path] = None,
+                      progress_callback: Optional[Callable[[int, int], None]] = None,
+                      frame_callback: Optional[Callable[[dict], None]] = None,
+                      render: bool = True) -> Optional[Path]:
+        """
+        执行目标检测，每帧的检测结果算出后立即交给回调，不等整个视频处理完
+        
+        Args:
+            source: 输入源路径
+            save_dir: 结果根目录，如果为None则使用默认目录
+            progress_callback: 进度回调，每处理完一帧调用一次，参数为(已处理帧数, 总帧数)
+            frame_callback: 逐帧结果回调，参数为帧结果字典：index为已处理帧序号（从0开始），
+                frame为该帧在视频中的帧号（从1开始，图片为0），timestamp_ms为该帧在视频中的时间，
+                detections、detection_count、image_size同图片检测接口；回调抛出异常时中止检测
+            render: 是否绘制并保存结果图片/视频，为False时只计算检测结果，不分配结果目录
             
-            # 检查输入源类型
-            source_info = self._analyze_source(source)
-            if not source_info['valid']:
-                self.logger.error(f"无效的输入源: {source}")
-                return None
+        Returns:
+            检测结果保存路径，render为False时为None
             
-            # 设置保存目录
-            save_dir = increment_path(Path(save_dir) / 'exp', exist_ok=False)
-            save_dir.mkdir(parents=True, exist_ok=True)
+        Raises:
+            RuntimeError: 模型加载失败
+            ValueError: 输入源无效
+        """
+        if self.model is None and not self.load_model():
+            raise RuntimeError("模型加载失败")
+        
+        source = str(source)
+        
+        # 检查输入源类型
+        source_info = self._analyze_source(source)
+        if not source_info['valid']:
+            raise ValueError(f"无效的输入源: {source}")
+        
+        if not render:
+            self._run_detection(source, None, source_info, progress_callback, frame_callback)
+            return None
+        
+        # 分配唯一的结果目录
+        key, save_dir = result_store.allocate(root=save_dir)
+        
+        # 执行检测
+        result = self._run_detection(source, save_dir, source_info, progress_callback, frame_callback)
+        result_store.set_size(key, sum(f.stat().st_size for f in save_dir.iterdir() if f.is_file()))
+        
+        return result
+    
+    @smart_inference_mode()
+    def infer_batch(self, images: List[np.ndarray]) -> List[torch.Tensor]:
+        """
+        对一批已解码的图片执行一次前向推理和NMS
+        
+        单张图片或尺寸相同的一批图片按步长letterbox到最小矩形（与逐张检测一致，PyTorch模型），
+        尺寸不同的图片统一letterbox到固定输入尺寸后堆叠成一个batch；检测框会缩放回各自原图的坐标系
+        
+        Args:
+            images: BGR格式的原图列表
             
-            # 执行检测
-            result = self._run_detection(source, save_dir, source_info)
+        Returns:
+            每张图片对应的检测结果张量 (n, 6)，列为 xyxy, conf, cls
+        """
+        if self.model is None and not self.load_model():
+            raise RuntimeError("模型未加载")
+        
+        preprocessor = self.plan.preprocessor
+        dt = (Profile(), Profile(), Profile())
+        
+        with preprocessor.acquire() as buffer:
+            # 预处理：尺寸相同时取最小矩形，减少填充部分的计算；尺寸不同时fill退回固定尺寸保证各图形状一致
+            with dt[0]:
+                im = preprocessor.fill(buffer, images, auto=self.plan.pt)
+            
+            # 推理
+            with self._inference_slot(), dt[1]:
+                pred = self.model(im, augment=self.config.augment)
+        
+        # NMS
+        with dt[2]:
+            pred = non_max_suppression(
+                pred, self.config.conf_thres, self.config.iou_thres,
+                self.config.classes, self.config.agnostic_nms, max_det=self.config.max_det
+            )
+            results = []
+            for det, im0 in zip(pred, images):
+                if len(det):
+                    det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+                results.append(det.cpu())
+        
+        self.last_timings = {'preprocess': dt[0].dt, 'inference': dt[1].dt, 'nms': dt[2].dt}
+        for stage, seconds in self.last_timings.items():
+            observe_stage(stage, seconds)
+        return results
+    
+    def detect_bytes(self, data: bytes, render: bool = True, persist: bool = False,
+                     save_dir: Optional[Path] = None, filename: str = 'image.jpg',
+                     with_original: bool = False, content_hash=None) -> Optional[dict]:
+        """
+        对内存中的编码图片执行目标检测，不经过磁盘
+        
+        启用结果缓存时，内容和检测参数相同的图片直接返回缓存结果，不再推理
+        
+        Args:
+            data: 图片文件的原始字节（JPEG/PNG等，可以是memoryview）
+            render, persist, save_dir, filename, with_original: 同detect_array
+            content_hash: 接收上传时已累计的内容哈希（见ResultCache.make_key）
             
-            # 清理GPU内存（如果使用GPU）
-            self._cleanup_memory()
+        Returns:
+            检测结果字典，失败时返回None
+        """
+        key = None
+        if result_cache.enabled:
+            key = result_cache.make_key(data, self.config, content_hash)
+            cached = result_cache.get(key, require_image=render or persist)
+            if cached is not None and self._cache_usable(cached, persist, with_original):
+                return self._result_from_cache(key, cached, render, persist, save_dir, filename)
+        
+        with stage_timer('decode'):
+            im0 = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if im0 is None:
+            self.logger.error("图片解码失败")
+            return None
+        
+        result = self.detect_array(im0, render=render, persist=persist, save_dir=save_dir, filename=filename,
+                                   with_original=with_original)
+        if result is not None and key is not None:
+            result_cache.put(key, dict(result))
+        return result
+    
+    def detect_array(self, im0: np.ndarray, render: bool = True, persist: bool = False,
+                     save_dir: Optional[Path] = None, filename: str = 'image.jpg',
+                     with_original: bool = False) -> Optional[dict]:
+        """
+        对已解码的图片执行目标检测
+        
+        Args:
+            im0: BGR格式的原图
+            render: 是否绘制检测框并编码结果图片
+            persist: 是否将结果图片写入新的结果目录（需要渲染，会忽略render=False）
+            save_dir: 结果根目录，如果为None则使用默认目录
+            filename: 结果图片文件名，编码格式为'source'时扩展名决定编码格式
+            with_original: 保存结果时是否同时保存原图的缩小版本（供页面对比显示）
             
-            return result
+        Returns:
+            检测结果字典：detections为format_detections格式的目标列表，shape为原图(h, w)，
+            image为编码后的结果图片（未渲染时为None），ext为图片编码格式，
+            encode为编码统计（输出尺寸、字节数、耗时、后端，未渲染时没有该项），
+            save_path为结果文件路径（未保存时为None），
+            variants为与结果文件同目录的缩小版本（保存时才有该项）：
+            {'result': [...], 'original': [...]}，每项包含name（文件名）、size(w, h)、bytes，按尺寸从小到大排列；
+            失败时返回None
+        """
+        try:
+            det = self._infer_single(im0)
+            return self.build_result(im0, det, render=render, persist=persist, save_dir=save_dir,
+                                     filename=filename, with_original=with_original)
             
         except Exception as e:
             self.logger.error(f"检测过程中发生错误: {e}")
-            # 发生错误时也要清理内存
-            self._cleanup_memory()
             return None
     
+    def infer_many(self, images: List[np.ndarray], batch_size: Optional[int] = None) -> List[torch.Tensor]:
+        """
+        推理多张图片：配置了执行器时全部提交给执行器凑批，否则按batch_size分批前向推理
+        
+        Args:
+            images: BGR格式的原图列表
+            batch_size: 每次前向推理的图片数，如果为None则使用服务计划的最大批大小
+            
+        Returns:
+            每张图片对应的检测结果张量
+        """
+        if self.executor is not None:
+            futures = [self.executor.submit(im0) for im0 in images]
+            return [future.result() for future in futures]
+        
+        batch_size = batch_size or self.plan.max_batch_size
+        results = []
+        for i in range(0, len(images), batch_size):
+            results.extend(self.infer_batch(images[i:i + batch_size]))
+        return results
+    
+    def build_result(self, im0: np.ndarray, det: torch.Tensor, render: bool = True, persist: bool = False,
+                     save_dir: Optional[Path] = None, filename: str = 'image.jpg',
+                     with_original: bool = False) -> dict:
+        """
+        由推理得到的检测结果构造结果字典，按需绘制、编码并保存结果图片
+        
+        Args:
+            im0: BGR格式的原图
+            det: 原图坐标系下的检测结果 (n, 6)
+            render, persist, save_dir, filename, with_original: 同detect_array
+            
+        Returns:
+            检测结果字典，格式同detect_array
+        """
+        result = {
+            'detections': self.format_detections(det, im0.shape, self.plan.names),
+            'shape': im0.shape[:2],
+            'image': None,
+            'ext': None,
+            'save_path': None
+        }
+        
+        if render or persist:
+            with stage_timer('annotate'):
+                annotated = self._annotate(im0.copy(), det, self.plan.names)
+            encoded = image_encoder.encode(annotated, filename)
+            result['image'] = encoded.pop('image')
+            result['ext'] = encoded['ext']
+            result['encode'] = encoded
+            
+            if persist:
+                # 缩小版本直接由内存中的绘制结果和原图生成，不重新读取或解码已保存的文件
+                variants = {'result': image_encoder.variants(annotated, filename)}
+                if with_original:
+                    variants['original'] = image_encoder.variants(im0, filename)
+                result['save_path'], result['variants'] = self._persist(
+                    result['image'], result['ext'], save_dir, filename, variants)
+        
+        return result
+    
+    def _persist(self, image: bytes, ext: str, save_dir: Optional[Path], filename: str,
+                 variants: Optional[dict] = None) -> tuple:
+        """
+        将编码后的结果图片及其缩小版本写入新的结果目录
+
+        Args:
+            image: 编码后的结果图片
+            ext: 图片扩展名
+            save_dir: 结果根目录，如果为None则使用默认目录
+            filename: 结果图片文件名
+            variants: 缩小版本，{'result'/'original': image_encoder.variants的返回值}
+
+        Returns:
+            (结果文件路径, 已保存的缩小版本信息，格式同detect_array返回的variants)
+        """
+        key, save_dir = result_store.allocate(root=save_dir)
+        save_path = save_dir / Path(filename).with_suffix(ext).name
+        saved = {}
+        size = len(image)
+        with stage_timer('file_write'):
+            save_path.write_bytes(image)
+            for kind, items in (variants or {}).items():
+                saved[kind] = []
+                for item in items:
+                    suffix = f"_{item['max_dimension']}" if kind == 'result' else f"_{kind}_{item['max_dimension']}"
+                    name = f'{save_path.stem}{suffix}{item["ext"]}'
+                    (save_dir / name).write_bytes(item['image'])
+                    size += item['bytes']
+                    saved[kind].append({'name': name, 'size': item['size'], 'bytes': item['bytes']})
+        result_store.set_size(key, size)
+        return save_path, saved
+    
+    @staticmethod
+    def _cache_usable(cached: dict, persist: bool, with_original: bool) -> bool:
+        """
+        缓存条目能否满足本次请求
+
+        需要保存结果时，已保存的结果目录被清理后只能由缓存图片重新写出原尺寸结果，
+        配置了缩小版本或需要原图缩小版本时按未命中处理，重新检测生成
+        """
+        if not persist:
+            return True
+        save_path = cached.get('save_path')
+        if not (save_path and Path(save_path).exists()):
+            return not image_encoder.config.variant_sizes and not with_original
+        return not with_original or 'original' in (cached.get('variants') or {})
+    
+    def _result_from_cache(self, key: str, cached: dict, render: bool, persist: bool,
+                           save_dir: Optional[Path], filename: str) -> dict:
+        """
+        由缓存条目构造检测结果，需要保存时优先复用仍然存在的结果文件
+
+        返回的结果带 cached=True：其结果目录由之前的请求和缓存条目共享，调用方出错时不能删除
+        """
+        result = dict(cached)
+        result['cached'] = True
+        if not (render or persist):
+            result['image'] = None
+            result.pop('encode', None)
+        elif result.get('encode'):
+            result['encode'] = {**result['encode'], 'seconds': 0.0}  # 本次请求未重新编码
+        
+        result['save_path'] = None
+        if not persist:
+            result.pop('variants', None)
+        else:
+            save_path = cached.get('save_path')
+            if not (save_path and Path(save_path).exists()):
+                save_path, variants = self._persist(cached['image'], cached['ext'], save_dir, filename)
+                result['variants'] = variants
+                result_cache.put(key, {**cached, 'save_path': save_path, 'variants': variants})
+            result['save_path'] = Path(save_path)
+        
+        self.logger.info(f"命中结果缓存: {key[:12]}")
+        return result
+    
+    @staticmethod
+    def format_detections(det: torch.Tensor, shape: tuple, names: dict) -> List[dict]:
+        """
+        将检测结果张量转换为可JSON序列化的目标列表
+        
+        Args:
+            det: 原图坐标系下的检测结果 (n, 6)，列为 xyxy, conf, cls；启用跟踪时为 (n, 7)，末列为track_id
+            shape: 原图尺寸 (h, w, ...)
+            names: 类别名称映射
+            
+        Returns:
+            目标列表，每项包含 xyxy（像素坐标）、xywhn（归一化中心点与宽高）、conf、class_id、class_name，
+            启用跟踪时另有 track_id
+        """
+        if not len(det):
+            return []
+        
+        gn = torch.tensor(shape)[[1, 0, 1, 0]]  # 归一化增益 whwh
+        det = det.cpu()
+        xywhn = (xyxy2xywh(det[:, :4]) / gn).tolist()
+        
+        detections = []
+        for row, box in zip(det.tolist(), xywhn):
+            *xyxy, conf, cls = row[:6]
+            c = int(cls)
+            item = {
+                'xyxy': [round(x, 1) for x in xyxy],
+                'xywhn': [round(x, 6) for x in box],
+                'conf': round(conf, 4),
+                'class_id': c,
+                'class_name': names[c]
+            }
+            if len(row) > 6:
+                item['track_id'] = int(row[6])
+            detections.append(item)
+        return detections
+    
+    def _infer_single(self, im0: np.ndarray) -> torch.Tensor:
+        """推理单张图片，配置了执行器（如微批处理调度器）时交给执行器凑批"""
+        if self.executor is not None:
+            return self.executor.submit(im0).result()
+        return self.infer_batch([im0])[0]
+    
+    def _annotate(self, im0: np.ndarray, det: torch.Tensor, names: dict) -> np.ndarray:
+        """在原图上绘制检测框和标签"""
+        if self.plan.renderer is not None:
+            return self.plan.renderer.render(im0, det)
+        
+        annotator = Annotator(im0, line_width=self.config.line_thickness, example=str(names))
+        for *xyxy, conf, cls in reversed(det[:, :6]):
+            c = int(cls)
+            label = None if self.config.hide_labels else (
+                names[c] if self.config.hide_conf else f'{names[c]} {conf:.2f}'
+            )
+            annotator.box_label(xyxy, label, color=colors(c, True))
+        return annotator.result()
+    
     def _analyze_source(self, source: str) -> dict:
         """分析输入源类型"""
         is_file = Path(source).suffix[1:] in (IMG_FORMATS + VID_FORMATS)
@@ -121,56 +567,82 @@ class YOLODetector:
             'screenshot': screenshot
         }
     
-    def _run_detection(self, source: str, save_dir: Path, source_info: dict) -> Path:
-        """执行检测的核心逻辑"""
+    def _run_detection(self, source: str, save_dir: Optional[Path], source_info: dict,
+                       progress_callback: Optional[Callable[[int, int], None]] = None,
+                       frame_callback: Optional[Callable[[dict], None]] = None) -> Optional[Path]:
+        """执行检测的核心逻辑（save_dir为None时不绘制和保存结果）"""
         # 检查并下载URL文件
         if source_info['is_url'] and source_info['is_file']:
             source = check_file(source)
         
-        # 检查图像尺寸
-        stride, names, pt = self.model.stride, self.model.names, self.model.pt
-        imgsz = check_img_size(self.config.imgsz, s=stride)
-        
-        # 创建数据加载器
-        dataset = self._create_dataloader(source, imgsz, stride, pt, source_info)
-        
-        # 预热模型
-        bs = len(dataset) if source_info['webcam'] else 1
-        self.model.warmup(imgsz=(1 if pt or self.model.triton else bs, 3, *imgsz))
+        # 创建数据加载器（模型已在加载时预热，这里不再逐请求预热）
+        dataset = self._create_dataloader(source, source_info)
         
         # 执行推理
-        self._process_detections(dataset, save_dir, imgsz, names, stride)
+        self._process_detections(dataset, save_dir, progress_callback, frame_callback)
         
         return save_dir
     
-    def _create_dataloader(self, source: str, imgsz: tuple, stride: int, pt: bool, source_info: dict):
-        """创建数据加载器"""
+    def _create_dataloader(self, source: str, source_info: dict):
+        """创建数据加载器（只负责读取和解码，预处理由服务计划的预处理器完成）"""
+        plan = self.plan
         if source_info['webcam']:
             check_imshow(warn=True)
-            return LoadStreams(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=self.config.vid_stride)
+            return LoadStreams(source, img_size=plan.imgsz, stride=plan.stride, auto=plan.pt,
+                               transforms=self._skip_transform, vid_stride=self.config.vid_stride)
         elif source_info['screenshot']:
-            return LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
+            return LoadScreenshots(source, img_size=plan.imgsz, stride=plan.stride, auto=plan.pt,
+                                   transforms=self._skip_transform)
         else:
-            return LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=self.config.vid_stride)
+            return LoadImages(source, img_size=plan.imgsz, stride=plan.stride, auto=plan.pt,
+                              transforms=self._skip_transform, vid_stride=self.config.vid_stride)
     
-    def _process_detections(self, dataset, save_dir: Path, imgsz: tuple, names: dict, stride: int):
+    @staticmethod
+    def _skip_transform(im0: np.ndarray) -> None:
+        """替代数据加载器内置的letterbox，避免重复预处理"""
+        return None
+    
+    def _process_detections(self, dataset, save_dir: Optional[Path],
+                            progress_callback: Optional[Callable[[int, int], None]] = None,
+                            frame_callback: Optional[Callable[[dict], None]] = None):
         """处理检测结果"""
+        # 视频文件和图片目录按流水线并行解码、推理和绘制；摄像头/截屏和逐层可视化逐帧串行处理
+        if self.config.video_pipeline and isinstance(dataset, LoadImages) and not self.config.visualize:
+            return self._process_pipelined(dataset, save_dir, progress_callback, frame_callback)
+        
+        plan = self.plan
         seen, windows, dt = 0, [], (Profile(), Profile(), Profile())
         vid_path, vid_writer = [None] * len(dataset), [None] * len(dataset)
+        # 视频按帧统计进度，图片按文件数统计
+        total = getattr(dataset, 'frames', None) or len(dataset)
+        # 启用跟踪时视频和摄像头每隔detect_interval帧推理一次，中间帧由跟踪器推算
+        trackers = TrackerSet(self.config.track_max_age, self.config.track_iou_thres) if self.config.tracker else None
+        interval = max(int(self.config.detect_interval), 1) if trackers is not None else 1
+        inferred = 0
         
-        for path, im, im0s, vid_cap, s in dataset:
-            # 预处理
-            with dt[0]:
-                im = torch.from_numpy(im).to(self.model.device)
-                im = im.half() if self.model.fp16 else im.float()
-                im /= 255
-                if len(im.shape) == 3:
-                    im = im[None]
+        for path, _, im0s, vid_cap, s in dataset:
+            index = dataset.count if isinstance(im0s, list) else getattr(dataset, 'frame', 1) - 1
+            if trackers is not None and dataset.mode != 'image' and index % interval:
+                self._process_single_detection(
+                    None, path, None, im0s, vid_cap, s, save_dir, plan.names,
+                    dataset, seen, vid_path, vid_writer, windows, dt, frame_callback, trackers
+                )
+                seen += 1
+                if progress_callback:
+                    progress_callback(seen, total)
+                continue
             
-            # 推理
-            with dt[1]:
-                visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if self.config.visualize else False
-                pred = self.model(im, augment=self.config.augment, visualize=visualize)
+            with plan.preprocessor.acquire() as buffer:
+                # 预处理（与数据加载器默认行为一致，PyTorch模型使用最小矩形输入）
+                with dt[0]:
+                    im = plan.preprocessor.fill(buffer, im0s if isinstance(im0s, list) else [im0s], auto=plan.pt)
+                
+                # 推理
+                with dt[1]:
+                    visualize = increment_path(save_dir / Path(path).stem, mkdir=True) \
+                        if self.config.visualize and save_dir else False
+                    with self._inference_slot():
+                        pred = self.model(im, augment=self.config.augment, visualize=visualize)
             
             # NMS
             with dt[2]:
@@ -178,70 +650,241 @@ class YOLODetector:
                     pred, self.config.conf_thres, self.config.iou_thres, 
                     self.config.classes, self.config.agnostic_nms, max_det=self.config.max_det
                 )
+            for stage, x in zip(('preprocess', 'inference', 'nms'), dt):
+                observe_stage(stage, x.dt)
             
             # 处理每张图片的检测结果
             self._process_single_detection(
-                pred, path, im, im0s, vid_cap, s, save_dir, names, 
-                dataset, seen, vid_path, vid_writer, windows, dt
+                pred, path, im, im0s, vid_cap, s, save_dir, plan.names, 
+                dataset, seen, vid_path, vid_writer, windows, dt, frame_callback, trackers
             )
+            inferred += 1
             seen += 1
+            if progress_callback:
+                progress_callback(seen, total)
+        
+        for writer in vid_writer:
+            if isinstance(writer, cv2.VideoWriter):
+                writer.release()
         
         # 打印统计信息
-        self._print_results(dt, seen, imgsz, save_dir)
+        if inferred:
+            self._print_results(dt, inferred, plan.imgsz, save_dir)
+    
+    def _process_pipelined(self, dataset, save_dir: Optional[Path],
+                           progress_callback: Optional[Callable[[int, int], None]] = None,
+                           frame_callback: Optional[Callable[[dict], None]] = None):
+        """
+        按流水线处理检测：解码线程读取帧，调用线程合并连续帧批量推理，绘制线程逐帧回调、绘制并写入结果
+        
+        解码阶段随帧记录视频的帧率和尺寸，数据加载器切换到下一个视频并释放上一个视频的读取器后，
+        绘制阶段仍能正确创建写入器；启用运动门控或跟踪间隔推理时部分帧不推理，推理帧数与占比记入last_pipeline_stats
+        """
+        plan = self.plan
+        dt = (Profile(), Profile(), Profile())
+        vid_path, vid_writer = [None], [None]
+        total = getattr(dataset, 'frames', None) or len(dataset)
+        seen = 0
+        
+        # 跳帧只用于视频：解码阶段按跟踪的推理间隔和运动门控决定每帧是否推理（schedule为(是否推理, 运动分数)），
+        # 推理阶段为跳过的帧推算结果：启用跟踪时由跟踪器推算，否则由运动门控的传播器沿用或外推上次的结果
+        gating, tracking = self.config.motion_gating, self.config.tracker
+        gate = MotionGate(self.config.motion_threshold, self.config.motion_pixel_delta,
+                          self.config.motion_max_skip, self.config.motion_size) if gating else None
+        trackers = TrackerSet(self.config.track_max_age, self.config.track_iou_thres) if tracking else None
+        propagator = BoxPropagator(self.config.motion_reuse) if gating and not tracking else None
+        interval = max(int(self.config.detect_interval), 1) if tracking else 1
+        inferred, current = 0, None
+        
+        def frames():
+            opened, count = None, 0
+            for path, _, im0, vid_cap, s in dataset:
+                schedule = None
+                if (gating or tracking) and dataset.mode == 'video':
+                    if path != opened:
+                        opened, count = path, 0
+                        if gate is not None:
+                            gate.reset()
+                    schedule = (count % interval == 0, None)
+                    count += 1
+                    if gate is not None and schedule[0]:
+                        schedule = gate.check(im0)
+                yield path, im0, s, getattr(dataset, 'frame', 0), dataset.mode, _video_meta(vid_cap), schedule
+        
+        def infer(batch: list) -> list:
+            nonlocal inferred, current
+            run = [item for item in batch if item[6] is None or item[6][0]]
+            pred = self._infer_frames(run, dt) if run else []
+            inferred += len(run)
+            
+            results, pred = [], iter(pred)
+            for path, im0, _, frame, _, _, schedule in batch:
+                if schedule is None or schedule[0]:
+                    det, shape, seconds = next(pred)
+                    if schedule is not None and trackers is not None:
+                        det = trackers.update(0, path, det)
+                    elif schedule is not None:
+                        if path != current:
+                            current = path
+                            propagator.reset()
+                        propagator.update(det, frame, im0.shape)
+                elif trackers is not None:
+                    det, shape, seconds = trackers.predict(0, path, im0.shape), '', 0.0
+                else:
+                    det, shape, seconds = propagator.predict(frame, moving=schedule[1] > 0), '', 0.0
+                results.append((det, shape, seconds, schedule))
+            return results
+        
+        def sink(item: tuple, result: tuple):
+            nonlocal seen
+            path, im0, s, frame, mode, meta, _ = item
+            det, shape, inference_seconds, schedule = result
+            self._finish_frame(det, im0, Path(path), s + shape, frame, meta, mode, seen, save_dir, plan.names,
+                               vid_path, vid_writer, 0, inference_seconds, frame_callback, schedule)
+            seen += 1
+            if progress_callback:
+                progress_callback(seen, total)
+        
+        pipeline = VideoPipeline(self.config.pipeline_batch_size, self.config.pipeline_queue_size)
+        try:
+            stats = self.last_pipeline_stats = pipeline.run(frames(), infer, sink)
+        finally:
+            for writer in vid_writer:
+                if isinstance(writer, cv2.VideoWriter):
+                    writer.release()
+        
+        frames_total = stats['infer']['items']
+        stats['inferred_frames'] = inferred
+        stats['inferred_fraction'] = round(inferred / frames_total, 4) if frames_total else 0.0
+        if gating:
+            MOTION_FRAMES_TOTAL.inc(inferred, result='inferred')
+            MOTION_FRAMES_TOTAL.inc(frames_total - inferred, result='skipped')
+        if gating or tracking:
+            LOGGER.info(f"Inferred {inferred}/{frames_total} frames ({stats['inferred_fraction']:.0%})"
+                        + (f", motion threshold {self.config.motion_threshold}" if gating else '')
+                        + (f", detect interval {interval}" if tracking else ''))
+        LOGGER.info('Pipeline: %.2fs, utilization %s' % (stats['wall_seconds'], ', '.join(
+            f"{name} {stats[name]['utilization']:.0%}" for name in ('decode', 'infer', 'sink'))))
+        if inferred:
+            self._print_results(dt, inferred, plan.imgsz, save_dir)
+    
+    def _infer_frames(self, batch: list, dt: tuple) -> list:
+        """
+        流水线推理阶段：一批帧一次前向推理和NMS，检测框缩放到原图坐标
+        
+        Returns:
+            逐帧的(检测结果, 输入尺寸字符串, 分摊的推理耗时)
+        """
+        plan = self.plan
+        images = [item[1] for item in batch]
+        with plan.preprocessor.acquire() as buffer:
+            with dt[0]:
+                im = plan.preprocessor.fill(buffer, images, auto=plan.pt)
+            with dt[1], self._inference_slot():
+                pred = self.model(im, augment=self.config.augment)
+        with dt[2]:
+            pred = non_max_suppression(
+                pred, self.config.conf_thres, self.config.iou_thres,
+                self.config.classes, self.config.agnostic_nms, max_det=self.config.max_det
+            )
+            for det, im0 in zip(pred, images):
+                if len(det):
+                    det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+            pred = [det.cpu() for det in pred]
+        for stage, x in zip(('preprocess', 'inference', 'nms'), dt):
+            observe_stage(stage, x.dt)
+        shape = '%gx%g ' % im.shape[2:]
+        return [(det, shape, dt[1].dt / len(batch)) for det in pred]
     
     def _process_single_detection(self, pred, path, im, im0s, vid_cap, s, save_dir, names, 
-                                dataset, seen, vid_path, vid_writer, windows, dt):
-        """处理单张图片的检测结果"""
-        for i, det in enumerate(pred):
-            if hasattr(dataset, 'mode') and dataset.mode == 'stream':
-                p, im0, frame = path[i], im0s[i].copy(), dataset.count
+                                dataset, seen, vid_path, vid_writer, windows, dt, frame_callback=None, trackers=None):
+        """处理单张图片的检测结果（pred为None表示该帧未推理，检测结果由跟踪器推算）"""
+        stream = isinstance(im0s, list)  # 多路摄像头
+        tracked = trackers is not None and dataset.mode != 'image'
+        for i in range(len(im0s) if stream else 1):
+            if stream:
+                p, im0, frame = path[i], im0s[i], dataset.count
                 s += f'{i}: '
             else:
-                p, im0, frame = path, im0s.copy(), getattr(dataset, 'frame', 0)
-            
-            p = Path(p)
-            save_path = str(save_dir / p.name)
-            s += '%gx%g ' % im.shape[2:]
-            
-            annotator = Annotator(im0, line_width=self.config.line_thickness, example=str(names))
+                p, im0, frame = path, im0s, getattr(dataset, 'frame', 0)
             
-            if len(det):
-                # 缩放边界框
-                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
-                
-                # 统计检测结果
-                for c in det[:, 5].unique():
-                    n = (det[:, 5] == c).sum()
-                    s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "
-                
-                # 绘制边界框
-                for *xyxy, conf, cls in reversed(det):
-                    c = int(cls)
-                    label = None if self.config.hide_labels else (
-                        names[c] if self.config.hide_conf else f'{names[c]} {conf:.2f}'
-                    )
-                    annotator.box_label(xyxy, label, color=colors(c, True))
-            
-            # 保存结果
-            im0 = annotator.result()
-            self._save_results(im0, save_path, dataset, vid_path, vid_writer, vid_cap, i)
+            if pred is None:
+                det, shape, seconds = trackers.predict(i, p, im0.shape), '', 0.0
+            else:
+                det, shape, seconds = pred[i], '%gx%g ' % im.shape[2:], dt[1].dt
+                if len(det):
+                    # 缩放边界框
+                    det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+                if tracked:
+                    det = trackers.update(i, p, det)
             
-            LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1E3:.1f}ms")
+            self._finish_frame(det, im0, Path(p), s + shape, frame, _video_meta(vid_cap), dataset.mode, seen,
+                               save_dir, names, vid_path, vid_writer, i, seconds, frame_callback,
+                               (pred is not None, None) if tracked else None)
+    
+    def _finish_frame(self, det, im0, p: Path, s: str, frame: int, meta: Optional[tuple], mode: str, index: int,
+                      save_dir: Optional[Path], names, vid_path, vid_writer, i: int, inference_seconds: float,
+                      frame_callback: Optional[Callable[[dict], None]] = None, schedule: Optional[tuple] = None):
+        """
+        输出一帧（一张图片）的检测结果：逐帧回调、绘制并写入结果文件、打印日志（det已缩放到原图坐标，
+        启用跟踪时末列为track_id）
+        
+        schedule为跳帧决定(是否推理, 运动分数)，未启用运动门控时运动分数为None，不跳帧时schedule为None
+        """
+        # 统计检测结果
+        if len(det):
+            for c in det[:, 5].unique():
+                n = (det[:, 5] == c).sum()
+                s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "
+        
+        if frame_callback:
+            frame_callback(self._frame_result(det, im0.shape, names, index, frame, meta, inference_seconds, schedule))
+        
+        # 绘制边界框并保存结果
+        if save_dir is not None:
+            with stage_timer('annotate'):
+                im0 = self._annotate(im0.copy(), det, names)
+            with stage_timer('file_write'):
+                self._save_results(im0, str(save_dir / p.name), mode, vid_path, vid_writer, meta, i)
+        
+        if schedule is None or schedule[0]:
+            timing = f"{inference_seconds * 1E3:.1f}ms"
+        else:
+            timing = ('tracked' if det.shape[1] > 6 else 'reused') + \
+                (f" (motion {schedule[1]:.4f})" if schedule[1] is not None else '')
+        LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{timing}")
+    
+    def _frame_result(self, det: torch.Tensor, shape: tuple, names: dict, index: int, frame: int,
+                      meta: Optional[tuple], inference_seconds: float, schedule: Optional[tuple] = None) -> dict:
+        """逐帧回调的帧结果字典（inferred为该帧是否经过推理，计算了运动分数时另有motion_score）"""
+        fps = meta[0] if meta else 0
+        detections = self.format_detections(det, shape, names)
+        result = {
+            'index': index,
+            'frame': frame,
+            'timestamp_ms': round((frame - 1) / fps * 1E3, 1) if fps and frame else None,
+            'detections': detections,
+            'detection_count': len(detections),
+            'image_size': [shape[1], shape[0]],
+            'inference_ms': round(inference_seconds * 1E3, 2),
+            'inferred': schedule is None or schedule[0]
+        }
+        if schedule is not None and schedule[1] is not None:
+            result['motion_score'] = round(schedule[1], 5)
+        return result
     
-    def _save_results(self, im0, save_path, dataset, vid_path, vid_writer, vid_cap, i):
-        """保存检测结果"""
-        if dataset.mode == 'image':
-            cv2.imwrite(save_path, im0)
+    def _save_results(self, im0, save_path, mode, vid_path, vid_writer, meta, i):
+        """保存检测结果（meta为视频的(帧率, 宽, 高)，见_video_meta）"""
+        if mode == 'image':
+            image_encoder.write(im0, save_path)
         else:  # video or stream
             if vid_path[i] != save_path:
                 vid_path[i] = save_path
                 if isinstance(vid_writer[i], cv2.VideoWriter):
                     vid_writer[i].release()
                 
-                if vid_cap:
-                    fps = vid_cap.get(cv2.CAP_PROP_FPS)
-                    w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                if meta:
+                    fps, w, h = meta
                 else:
                     fps, w, h = 30, im0.shape[1], im0.shape[0]
                 
@@ -254,24 +897,16 @@ class YOLODetector:
         """打印检测结果统计"""
         t = tuple(x.t / seen * 1E3 for x in dt)
         LOGGER.info(f'Speed: %.1fms pre-process, %.1fms inference, %.1fms NMS per image at shape {(1, 3, *imgsz)}' % t)
-        LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}")
-    
-    def _cleanup_memory(self):
-        """
-        清理内存和GPU显存
-        防止长时间运行导致的内存泄漏
-        """
-        try:
-            # 清理Python垃圾回收
-            gc.collect()
-            
-            # 如果使用GPU，清理CUDA缓存
-            if torch.cuda.is_available() and self.device.type == 'cuda':
-                torch.cuda.empty_cache()
-                torch.cuda.synchronize()
-                self.logger.debug("GPU内存已清理")
-        except Exception as e:
-            self.logger.warning(f"内存清理时出现警告: {e}")
+        if save_dir is not None:
+            LOGGER.info(f"Results saved to {colorstr('bold', save_dir)}")
+
+
+def _video_meta(vid_cap) -> Optional[tuple]:
+    """读取视频的(帧率, 宽, 高)，不是视频时返回None"""
+    if not vid_cap:
+        return None
+    return (vid_cap.get(cv2.CAP_PROP_FPS), int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
 
 
 # 全局检测器实例
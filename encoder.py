@@ -0,0 +1,191 @@
+"""
+结果图片编码模块
+按配置的格式、质量和最大尺寸编码结果图片，安装了PyTurboJPEG时使用libjpeg-turbo编码JPEG，
+并记录每次编码的耗时和输出字节数
+"""
+import logging
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from config import config, EncodeConfig
+from metrics import metrics, observe_stage
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+except ImportError:  # 没有PyTurboJPEG时使用OpenCV编码
+    TurboJPEG = None
+
+ENCODED_BYTES = metrics.histogram(
+    'yolo_encoded_bytes', 'Encoded result image size in bytes', ['format'],
+    buckets=(16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6)
+)
+
+# 输出格式 -> 扩展名
+FORMAT_EXTENSIONS = {'jpeg': '.jpg', 'jpg': '.jpg', 'webp': '.webp'}
+
+
+class ImageEncoder:
+    """结果图片编码类"""
+
+    def __init__(self, encode_config: Optional[EncodeConfig] = None):
+        """
+        初始化编码器
+
+        Args:
+            encode_config: 编码配置对象，如果为None则使用默认配置
+        """
+        self.config = encode_config or config.encode
+        self.logger = logging.getLogger(__name__)
+        self._turbo = self._load_turbo() if self.config.backend in ('auto', 'turbojpeg') else None
+
+    def _load_turbo(self):
+        """加载libjpeg-turbo编码器，不可用时返回None"""
+        if TurboJPEG is None:
+            if self.config.backend == 'turbojpeg':
+                self.logger.warning("未安装PyTurboJPEG，JPEG编码使用OpenCV")
+            return None
+        try:
+            return TurboJPEG()
+        except Exception as e:  # 已安装Python包但找不到libturbojpeg动态库
+            self.logger.warning(f"libjpeg-turbo加载失败，JPEG编码使用OpenCV: {e}")
+            return None
+
+    @property
+    def backend(self) -> str:
+        """JPEG编码实际使用的后端"""
+        return 'turbojpeg' if self._turbo is not None else 'opencv'
+
+    def extension(self, filename: Optional[str] = None) -> str:
+        """
+        确定输出图片的扩展名
+
+        Args:
+            filename: 上传文件名，格式为'source'时沿用其扩展名
+
+        Returns:
+            带点的小写扩展名，如 '.jpg'
+        """
+        fmt = self.config.format.lower()
+        if fmt == 'source':
+            # 不支持写出的格式（如gif）统一编码为jpg
+            if filename and cv2.haveImageWriter(filename):
+                return Path(filename).suffix.lower()
+            return '.jpg'
+        return FORMAT_EXTENSIONS.get(fmt, '.jpg')
+
+    def encode(self, im: np.ndarray, filename: Optional[str] = None) -> dict:
+        """
+        编码图片，超出最大尺寸时先等比缩小
+
+        Args:
+            im: BGR格式的图片
+            filename: 上传文件名，决定'source'格式下的输出格式
+
+        Returns:
+            编码结果字典：image为编码后的字节，ext为扩展名，size为输出图片(w, h)，
+            bytes为字节数，seconds为耗时（含缩放），backend为编码后端
+
+        Raises:
+            RuntimeError: 编码失败
+        """
+        ext = self.extension(filename)
+        start = time.perf_counter()
+        im = self._downscale(im)
+
+        quality = int(self.config.quality)
+        if ext in ('.jpg', '.jpeg') and self._turbo is not None:
+            image = self._turbo.encode(np.ascontiguousarray(im), quality=quality, pixel_format=TJPF_BGR)
+            backend = 'turbojpeg'
+        else:
+            ok, buf = cv2.imencode(ext, im, self._params(ext, quality))
+            if not ok:
+                raise RuntimeError(f"结果图片编码失败: {ext}")
+            image = buf.tobytes()
+            backend = 'opencv'
+
+        seconds = time.perf_counter() - start
+        observe_stage('encode', seconds)
+        ENCODED_BYTES.observe(len(image), format=ext.lstrip('.'))
+        return {
+            'image': image,
+            'ext': ext,
+            'size': (im.shape[1], im.shape[0]),
+            'bytes': len(image),
+            'seconds': seconds,
+            'backend': backend
+        }
+
+    def variants(self, im: np.ndarray, filename: Optional[str] = None) -> List[dict]:
+        """
+        按variant_sizes生成缩小版本，由大到小逐级缩放，每级只缩放一次
+
+        Args:
+            im: BGR格式的原尺寸图片
+            filename: 上传文件名，决定'source'格式下的输出格式
+
+        Returns:
+            编码结果字典列表（同encode，另有max_dimension为该版本的最长边上限），按尺寸从小到大排列；
+            不小于输出图片（受max_dimension限制）的尺寸不生成
+        """
+        longest = max(im.shape[:2])
+        if self.config.max_dimension:
+            longest = min(longest, self.config.max_dimension)
+        sizes = sorted({int(s) for s in self.config.variant_sizes or () if 0 < s < longest}, reverse=True)
+
+        encoded = []
+        for size in sizes:
+            start = time.perf_counter()
+            im = _fit(im, size)
+            resize_seconds = time.perf_counter() - start
+            item = self.encode(im, filename)
+            item['seconds'] += resize_seconds
+            item['max_dimension'] = size
+            encoded.append(item)
+        return encoded[::-1]
+
+    def write(self, im: np.ndarray, save_path: Path) -> Path:
+        """
+        编码图片并写入文件，扩展名按输出格式修改
+
+        Args:
+            im: BGR格式的图片
+            save_path: 目标路径
+
+        Returns:
+            实际写入的文件路径
+        """
+        save_path = Path(save_path)
+        encoded = self.encode(im, save_path.name)
+        save_path = save_path.with_suffix(encoded['ext'])
+        save_path.write_bytes(encoded['image'])
+        return save_path
+
+    def _downscale(self, im: np.ndarray) -> np.ndarray:
+        """最长边超过max_dimension时等比缩小"""
+        return _fit(im, self.config.max_dimension) if self.config.max_dimension else im
+
+    @staticmethod
+    def _params(ext: str, quality: int) -> list:
+        """OpenCV编码参数"""
+        if ext in ('.jpg', '.jpeg'):
+            return [cv2.IMWRITE_JPEG_QUALITY, quality]
+        if ext == '.webp':
+            return [cv2.IMWRITE_WEBP_QUALITY, quality]
+        return []
+
+
+def _fit(im: np.ndarray, limit: int) -> np.ndarray:
+    """最长边超过limit时等比缩小"""
+    h, w = im.shape[:2]
+    if max(h, w) <= limit:
+        return im
+    r = limit / max(h, w)
+    return cv2.resize(im, (max(round(w * r), 1), max(round(h * r), 1)), interpolation=cv2.INTER_AREA)
+
+
+# 全局编码器实例
+image_encoder = ImageEncoder()
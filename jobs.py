@@ -0,0 +1,252 @@
+"""
+异步检测任务模块
+视频等耗时检测在后台线程池中执行，HTTP请求只负责提交任务和查询进度；
+流式任务的逐帧检测结果经有界队列实时交给请求线程返回
+"""
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+from config import config
+from detector import YOLODetector, detector
+from utils_app import file_manager
+
+
+@dataclass
+class DetectionJob:
+    """检测任务状态"""
+    job_id: str
+    filename: str
+    source: Path
+    status: str = 'queued'  # queued / running / done / failed / cancelled
+    render: bool = True  # 是否绘制并保存结果视频
+    frames_done: int = 0
+    frames_total: int = 0
+    frames_inferred: int = 0  # 实际推理的帧数（启用运动门控时少于frames_done）
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result_url: Optional[str] = None
+    error: Optional[str] = None
+    # 流式任务的事件队列（非流式任务为None），客户端断开后置cancelled，检测在下一帧中止
+    events: Optional[queue.Queue] = field(default=None, repr=False)
+    cancelled: bool = False
+
+    def publish(self, event: dict):
+        """
+        发布一个流式事件，队列已满时等待客户端读取（背压）
+
+        Raises:
+            RuntimeError: 任务已被取消
+        """
+        while not self.cancelled:
+            try:
+                self.events.put(event, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("客户端已断开，任务取消")
+
+    @property
+    def fps(self) -> float:
+        """当前处理速度（帧/秒）"""
+        if not self.started_at or not self.frames_done:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.frames_done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """预计剩余时间（秒），无法估计时为None"""
+        if self.status == 'done':
+            return 0.0
+        fps = self.fps
+        if not fps or not self.frames_total:
+            return None
+        return max(self.frames_total - self.frames_done, 0) / fps
+
+    def to_dict(self) -> dict:
+        """转换为API响应字典"""
+        eta = self.eta
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'filename': self.filename,
+            'progress': {
+                'frames_done': self.frames_done,
+                'frames_total': self.frames_total,
+                'frames_inferred': self.frames_inferred,
+                'percent': round(100 * self.frames_done / self.frames_total, 1) if self.frames_total else 0.0,
+                'fps': round(self.fps, 2),
+                'eta_seconds': round(eta, 1) if eta is not None else None
+            },
+            'result_url': self.result_url,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """异步检测任务管理类"""
+
+    def __init__(self, yolo_detector: Optional[YOLODetector] = None,
+                 max_workers: Optional[int] = None, max_history: Optional[int] = None):
+        """
+        初始化任务管理器
+
+        Args:
+            yolo_detector: 执行检测的检测器，如果为None则使用全局检测器
+            max_workers: 同时运行的任务数上限，如果为None则使用配置中的值
+            max_history: 内存中保留的任务数上限，如果为None则使用配置中的值
+        """
+        self.detector = yolo_detector or detector
+        self.max_workers = max_workers or config.app.max_video_jobs
+        self.max_history = max_history or config.app.max_job_history
+        self.logger = logging.getLogger(__name__)
+
+        # 线程池的大小即为并发任务上限，超出的任务排队等待，不占用Flask工作线程
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='detect-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self) -> int:
+        """排队等待执行的任务数"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == 'queued')
+
+    def submit(self, source: Path, filename: str, render: bool = True, stream: bool = False) -> DetectionJob:
+        """
+        提交检测任务
+
+        Args:
+            source: 已保存的上传文件路径
+            filename: 原始文件名
+            render: 是否绘制并保存结果视频
+            stream: 是否逐帧发布检测结果（通过stream读取）
+
+        Returns:
+            新建的任务对象
+        """
+        job = DetectionJob(job_id=uuid.uuid4().hex, filename=filename, source=source, render=render)
+        if stream:
+            job.events = queue.Queue(maxsize=max(config.app.stream_queue_frames, 1))
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._prune()
+        self._executor.submit(self._run, job)
+        self.logger.info(f"检测任务已提交: {job.job_id} ({filename})")
+        return job
+
+    def get(self, job_id: str) -> Optional[DetectionJob]:
+        """
+        查询任务
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            任务对象，不存在时返回None
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stream(self, job: DetectionJob) -> Iterator[dict]:
+        """
+        读取流式任务的事件，直到任务结束
+
+        生成器被关闭（客户端断开）时取消任务：排队中的任务不再执行，运行中的任务在下一帧中止
+
+        Args:
+            job: 以stream=True提交的任务
+
+        Yields:
+            事件字典：event为 'frame'（帧结果）、'done'（完成）或 'error'（失败）
+        """
+        try:
+            while True:
+                event = job.events.get()
+                yield event
+                if event['event'] in ('done', 'error'):
+                    return
+        finally:
+            if job.status in ('queued', 'running'):
+                job.cancelled = True
+
+    def _prune(self):
+        """丢弃最早的已结束任务，防止任务记录无限增长（调用方持有锁）"""
+        while len(self._jobs) > self.max_history:
+            for job_id, job in self._jobs.items():
+                if job.status in ('done', 'failed', 'cancelled'):
+                    del self._jobs[job_id]
+                    break
+            else:
+                break
+
+    def _run(self, job: DetectionJob):
+        """在后台线程中执行检测任务"""
+        job.status = 'running'
+        job.started_at = time.time()
+
+        def on_progress(done: int, total: int):
+            job.frames_done = done
+            job.frames_total = max(total, done)
+
+        def on_frame(result: dict):
+            job.frames_inferred += result['inferred']
+            if job.events is not None:
+                job.publish({'event': 'frame', **result})
+
+        try:
+            if job.cancelled:
+                raise RuntimeError("客户端已断开，任务取消")
+            # 检测异常直接抛出，错误原因记入任务（流式任务随error事件返回给客户端）
+            result_dir = self.detector.detect_frames(job.source, progress_callback=on_progress,
+                                                     frame_callback=on_frame, render=job.render)
+            if job.render:
+                result_files = [f for f in result_dir.glob('*') if f.is_file()] if result_dir else []
+                if not result_files:
+                    raise RuntimeError("未生成检测结果")
+                job.result_url = file_manager.get_result_url(result_files[0])
+            job.status = 'done'
+            self.logger.info(f"检测任务完成: {job.job_id}, {job.frames_done} 帧（推理 {job.frames_inferred} 帧）, "
+                             f"{job.fps:.1f} FPS")
+
+        except Exception as e:
+            job.error = str(e)
+            if job.cancelled:
+                job.status = 'cancelled'
+                self.logger.info(f"检测任务已取消: {job.job_id}, 已处理 {job.frames_done} 帧")
+            else:
+                job.status = 'failed'
+                self.logger.error(f"检测任务失败: {job.job_id}: {e}")
+
+        finally:
+            job.finished_at = time.time()
+            file_manager.discard(job.source)
+            if job.events is not None:
+                self._publish_end(job)
+
+    def _publish_end(self, job: DetectionJob):
+        """发布流式任务的结束事件（客户端已断开时丢弃）"""
+        if job.status == 'done':
+            event = {'event': 'done', 'job_id': job.job_id, 'frames': job.frames_done,
+                     'frames_inferred': job.frames_inferred,
+                     'inferred_fraction': round(job.frames_inferred / job.frames_done, 4) if job.frames_done else 0.0,
+                     'fps': round(job.fps, 2), 'result_url': job.result_url}
+        else:
+            event = {'event': 'error', 'job_id': job.job_id, 'message': job.error}
+        try:
+            job.publish(event)
+        except RuntimeError:
+            pass
+
+
+# 全局任务管理器实例
+job_manager = JobManager()
@@ -0,0 +1,186 @@
+"""
+内存管理策略模块
+后台线程监控进程内存和CUDA显存水位，按间隔或超过水位时执行垃圾回收和显存缓存释放，
+检测请求本身不再做任何回收
+"""
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import torch
+
+from config import config, MemoryConfig
+from metrics import metrics
+
+try:
+    import psutil
+except ImportError:  # 没有psutil时从/proc读取RSS（仅Linux）
+    psutil = None
+
+MEMORY_BYTES = metrics.gauge('yolo_memory_bytes', 'Process memory usage in bytes', ['kind'])
+COLLECTIONS_TOTAL = metrics.counter('yolo_memory_collections_total', 'Memory collections performed', ['reason'])
+RECLAIMED_BYTES_TOTAL = metrics.counter('yolo_memory_reclaimed_bytes_total', 'Memory reclaimed by collections', ['kind'])
+COLLECT_SECONDS = metrics.histogram('yolo_memory_collect_seconds', 'Time spent in memory collections')
+
+
+def _rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存字节数，无法获取时返回None"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _cuda_in_use() -> bool:
+    """本进程是否已初始化CUDA"""
+    return torch.cuda.is_available() and torch.cuda.is_initialized()
+
+
+class MemoryPolicy:
+    """内存管理策略类"""
+
+    def __init__(self, memory_config: Optional[MemoryConfig] = None):
+        """
+        初始化内存管理策略
+
+        Args:
+            memory_config: 内存管理配置对象，如果为None则使用默认配置
+        """
+        self.config = memory_config or config.memory
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.last_collect = time.monotonic()
+        self.collections = 0
+        self.reclaimed = {'rss': 0, 'vram': 0}
+
+        MEMORY_BYTES.set_function(lambda: self.usage()['rss'] or 0, kind='rss')
+        MEMORY_BYTES.set_function(lambda: self.usage()['vram_allocated'], kind='vram_allocated')
+        MEMORY_BYTES.set_function(lambda: self.usage()['vram_reserved'], kind='vram_reserved')
+
+    def start(self):
+        """启动后台监控线程（重复调用无副作用）"""
+        if not self.config.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='memory-policy', daemon=True)
+        self._thread.start()
+        cfg = self.config
+        self.logger.info(f"内存管理策略已启动: 每 {cfg.check_interval_seconds}s 检查一次, "
+                         f"RSS高水位 {f'{cfg.rss_high_mb}MB' if cfg.rss_high_mb else '不限'}, "
+                         f"显存高水位 {f'{cfg.vram_high_mb}MB' if cfg.vram_high_mb else '不限'}, "
+                         f"定期回收间隔 {f'{cfg.collect_interval_seconds}s' if cfg.collect_interval_seconds else '不启用'}")
+
+    def stop(self):
+        """停止后台监控线程"""
+        self._stop.set()
+
+    def usage(self) -> dict:
+        """
+        当前内存占用
+
+        Returns:
+            rss为进程常驻内存字节数（无法获取时为None），
+            vram_allocated/vram_reserved为CUDA已分配/缓存显存字节数（未使用CUDA时为0）
+        """
+        cuda = _cuda_in_use()
+        return {
+            'rss': _rss_bytes(),
+            'vram_allocated': torch.cuda.memory_allocated() if cuda else 0,
+            'vram_reserved': torch.cuda.memory_reserved() if cuda else 0
+        }
+
+    def check(self) -> Optional[dict]:
+        """
+        检查内存水位，满足条件时执行一次回收
+
+        Returns:
+            执行回收时返回回收统计（同collect），否则返回None
+        """
+        cfg = self.config
+        usage = self.usage()
+        since_last = time.monotonic() - self.last_collect
+
+        reason = None
+        if cfg.collect_interval_seconds and since_last >= cfg.collect_interval_seconds:
+            reason = 'periodic'
+        elif since_last >= cfg.min_collect_gap_seconds:
+            if cfg.rss_high_mb and usage['rss'] and usage['rss'] > cfg.rss_high_mb * 1024 * 1024:
+                reason = 'rss'
+            elif cfg.vram_high_mb and usage['vram_reserved'] > cfg.vram_high_mb * 1024 * 1024:
+                reason = 'vram'
+
+        return self.collect(reason, before=usage) if reason else None
+
+    def collect(self, reason: str = 'manual', before: Optional[dict] = None) -> dict:
+        """
+        执行垃圾回收，使用CUDA时释放缓存的显存
+
+        Args:
+            reason: 回收原因，如 'periodic'、'rss'、'vram'、'manual'
+            before: 回收前的内存占用，如果为None则重新读取
+
+        Returns:
+            回收统计：reason、objects（回收的对象数）、rss_reclaimed、vram_reclaimed（字节）、seconds
+        """
+        with self._lock:
+            before = before or self.usage()
+            start = time.perf_counter()
+
+            objects = gc.collect()
+            if _cuda_in_use():
+                torch.cuda.empty_cache()
+
+            after = self.usage()
+            seconds = time.perf_counter() - start
+            rss_reclaimed = max((before['rss'] or 0) - (after['rss'] or 0), 0)
+            vram_reclaimed = max(before['vram_reserved'] - after['vram_reserved'], 0)
+
+            self.last_collect = time.monotonic()
+            self.collections += 1
+            self.reclaimed['rss'] += rss_reclaimed
+            self.reclaimed['vram'] += vram_reclaimed
+
+        COLLECTIONS_TOTAL.inc(reason=reason)
+        RECLAIMED_BYTES_TOTAL.inc(rss_reclaimed, kind='rss')
+        RECLAIMED_BYTES_TOTAL.inc(vram_reclaimed, kind='vram')
+        COLLECT_SECONDS.observe(seconds)
+        self.logger.info(f"内存回收 ({reason}): 回收 {objects} 个对象, 释放内存 {rss_reclaimed / 1024 / 1024:.1f}MB, "
+                         f"释放显存 {vram_reclaimed / 1024 / 1024:.1f}MB, 耗时 {seconds * 1E3:.1f}ms")
+        return {
+            'reason': reason,
+            'objects': objects,
+            'rss_reclaimed': rss_reclaimed,
+            'vram_reclaimed': vram_reclaimed,
+            'seconds': seconds
+        }
+
+    def stats(self) -> dict:
+        """当前内存占用和累计回收统计"""
+        return {
+            **self.usage(),
+            'collections': self.collections,
+            'rss_reclaimed_total': self.reclaimed['rss'],
+            'vram_reclaimed_total': self.reclaimed['vram']
+        }
+
+    def _run(self):
+        """后台监控循环"""
+        while not self._stop.wait(self.config.check_interval_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"内存检查失败: {e}")
+
+
+# 全局内存管理策略实例
+memory_policy = MemoryPolicy()
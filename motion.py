@@ -0,0 +1,146 @@
+"""
+运动门控模块
+视频相邻帧画面变化不大时不必每帧推理：解码阶段把帧缩小为灰度缩略图，与上次推理的帧比较，
+变化超过阈值才推理；其余帧沿用上次推理的检测结果，或按最近两次推理之间的位移线性外推边界框
+"""
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from utils.general import clip_boxes
+from utils.metrics import box_iou
+
+from metrics import metrics
+
+MOTION_FRAMES_TOTAL = metrics.counter(
+    'yolo_motion_frames_total', 'Video frames seen by motion gating', ['result']
+)
+
+
+class MotionGate:
+    """按画面变化决定是否推理（每个视频一个实例，切换视频时reset）"""
+
+    def __init__(self, threshold: float = 0.005, pixel_delta: int = 20, max_skip: int = 15, size: int = 160):
+        """
+        初始化运动门控
+
+        Args:
+            threshold: 触发推理的运动分数（变化像素占缩略图的比例），越大跳过的帧越多
+            pixel_delta: 灰度差超过该值的像素计为变化，用于滤除噪声和压缩伪影
+            max_skip: 最多连续跳过的帧数，之后强制推理一次，防止缓慢变化长期累积
+            size: 缩略图宽度（像素），高度按原图比例计算
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_skip = max(int(max_skip), 0)
+        self.size = max(int(size), 8)
+        self.reset()
+
+    def reset(self):
+        """清空参考帧，下一帧必定推理"""
+        self._reference = None
+        self._skipped = 0
+
+    def check(self, im0: np.ndarray) -> Tuple[bool, float]:
+        """
+        计算一帧的运动分数并决定是否推理，需要推理时该帧成为新的参考帧
+
+        Args:
+            im0: BGR原图
+
+        Returns:
+            (是否推理, 运动分数)，没有参考帧时分数为1.0
+        """
+        h, w = im0.shape[:2]
+        size = (self.size, max(round(self.size * h / w), 1))
+        thumb = cv2.cvtColor(cv2.resize(im0, size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+        if self._reference is None or self._reference.shape != thumb.shape:
+            score = 1.0
+        else:
+            changed = cv2.absdiff(thumb, self._reference) > self.pixel_delta
+            score = float(np.count_nonzero(changed)) / changed.size
+
+        if score >= self.threshold or self._skipped >= self.max_skip:
+            self._reference = thumb
+            self._skipped = 0
+            return True, score
+        self._skipped += 1
+        return False, score
+
+
+class BoxPropagator:
+    """为跳过推理的帧提供检测结果（每个视频一个实例，切换视频时reset）"""
+
+    def __init__(self, mode: str = 'hold', min_iou: float = 0.3):
+        """
+        初始化边界框传播器
+
+        Args:
+            mode: 'hold' 沿用上次推理的结果；'linear' 按最近两次推理间匹配到的同类目标的位移线性外推
+            min_iou: linear模式下两次推理的目标视为同一目标的最小IoU
+        """
+        if mode not in ('hold', 'linear'):
+            raise ValueError(f"不支持的传播方式: {mode}")
+        self.mode = mode
+        self.min_iou = min_iou
+        self.reset()
+
+    def reset(self):
+        """清空上次推理的结果"""
+        self._det = None
+        self._frame = 0
+        self._shape = None
+        self._velocity = None
+
+    def update(self, det: torch.Tensor, frame: int, shape: tuple):
+        """
+        记录一次推理的结果（已缩放到原图坐标）
+
+        Args:
+            det: 检测结果 (n, 6)：xyxy、置信度、类别
+            frame: 帧号
+            shape: 原图尺寸
+        """
+        if self.mode == 'linear':
+            self._velocity = self._match_velocity(det, frame) if self._det is not None else None
+        self._det, self._frame, self._shape = det, frame, shape
+
+    def predict(self, frame: int, moving: bool = True) -> Optional[torch.Tensor]:
+        """
+        推算指定帧的检测结果
+
+        Args:
+            frame: 帧号（大于上次推理的帧号）
+            moving: 画面相对上次推理是否有变化，没有变化时不外推
+
+        Returns:
+            检测结果 (n, 6)，尚无推理结果时返回None
+        """
+        if self._det is None:
+            return None
+        det = self._det.clone()
+        if moving and self._velocity is not None and len(det):
+            det[:, :4] += self._velocity * (frame - self._frame)
+            clip_boxes(det[:, :4], self._shape)
+        return det
+
+    def _match_velocity(self, det: torch.Tensor, frame: int) -> Optional[torch.Tensor]:
+        """按IoU贪心匹配两次推理中的同类目标，返回每个当前目标每帧的位移（未匹配的为0）"""
+        prev, gap = self._det, frame - self._frame
+        if gap <= 0 or not len(det) or not len(prev):
+            return None
+        velocity = torch.zeros_like(det[:, :4])
+        iou = box_iou(det[:, :4], prev[:, :4])
+        iou[det[:, 5:6] != prev[:, 5].unsqueeze(0)] = 0
+        for _ in range(min(len(det), len(prev))):
+            best = int(iou.argmax())
+            i, j = divmod(best, iou.shape[1])
+            if iou[i, j] < self.min_iou:
+                break
+            velocity[i] = (det[i, :4] - prev[j, :4]) / gap
+            iou[i, :] = 0
+            iou[:, j] = 0
+        return velocity
@@ -0,0 +1,180 @@
+"""
+文件探测模块
+只读取文件头识别真实格式和图片像素尺寸，在保存、解码和推理之前拒绝伪装或损坏的文件
+"""
+import struct
+from typing import Optional, Tuple
+
+# 识别文件类型所需的文件头字节数（tar的魔数位于第257字节）
+SNIFF_BYTES = 512
+
+# 不带尺寸信息的JPEG标记（无长度字段）
+_JPEG_STANDALONE = {0x01, *range(0xD0, 0xD8)}
+# JPEG帧头标记（SOF0-SOF15，不含DHT、JPG、DAC）
+_JPEG_SOF = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# ISO-BMFF（ftyp）主品牌：静态图片品牌按图片识别（格式不在允许列表内，由校验拒绝），
+# 只有已知的视频品牌按视频识别，其余（如M4A音频）无法识别
+_FTYP_IMAGE = {b'heic': 'heic', b'heix': 'heic', b'mif1': 'heif', b'msf1': 'heif', b'avif': 'avif'}
+_FTYP_VIDEO = {b'isom': 'mp4', b'iso2': 'mp4', b'mp41': 'mp4', b'mp42': 'mp4', b'avc1': 'mp4', b'M4V ': 'mp4',
+               b'qt  ': 'mov'}
+
+
+def sniff_type(head: bytes) -> Optional[Tuple[str, str]]:
+    """
+    根据文件头识别文件类型
+
+    Args:
+        head: 文件开头的若干字节（识别tar需要至少262字节，其余格式12字节）
+
+    Returns:
+        (类别, 格式)，类别为 'image'、'video' 或 'archive'，如 ('image', 'jpeg')；无法识别时返回None
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image', 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image', 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image', 'gif'
+    if head.startswith(b'BM'):
+        return 'image', 'bmp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'image', 'tiff'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'image', 'webp'
+    if head.startswith(b'RIFF') and head[8:12] == b'AVI ':
+        return 'video', 'avi'
+    if head[4:8] == b'ftyp':
+        brand = bytes(head[8:12])
+        if brand in _FTYP_IMAGE:
+            return 'image', _FTYP_IMAGE[brand]
+        if brand in _FTYP_VIDEO:
+            return 'video', _FTYP_VIDEO[brand]
+        if brand.startswith(b'3gp'):
+            return 'video', 'mp4'
+        return None
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'video', 'mkv'
+    if head.startswith(b'FLV'):
+        return 'video', 'flv'
+    if head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):
+        return 'video', 'wmv'
+    if head[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+        return 'archive', 'zip'
+    if head[257:262] == b'ustar':
+        return 'archive', 'tar'
+    if head.startswith(b'\x1f\x8b'):
+        return 'archive', 'gz'
+    if head.startswith(b'BZh'):
+        return 'archive', 'bz2'
+    if head.startswith(b'\xfd7zXZ\x00'):
+        return 'archive', 'xz'
+    return None
+
+
+def probe_image_size(data: bytes, fmt: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """
+    只解析文件头读取图片的像素尺寸，不解码像素数据
+
+    Args:
+        data: 图片文件内容（至少包含文件头，JPEG需包含帧头之前的全部段），可以是memoryview
+        fmt: sniff_type识别出的格式，如果为None则重新识别
+
+    Returns:
+        (宽, 高)，文件头损坏或格式不支持时返回None
+    """
+    if fmt is None:
+        sniffed = sniff_type(bytes(data[:SNIFF_BYTES]))
+        fmt = sniffed[1] if sniffed else None
+    parser = _PARSERS.get(fmt)
+    if parser is None:
+        return None
+    try:
+        size = parser(data)
+    except (struct.error, IndexError, ValueError):
+        return None
+    if size is None or size[0] <= 0 or size[1] <= 0:
+        return None
+    return size
+
+
+def _jpeg_size(data) -> Optional[Tuple[int, int]]:
+    """逐段跳过JPEG标记段直到帧头（SOF），只读取各段的标记和长度"""
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # 填充字节
+            i += 1
+            continue
+        if marker in _JPEG_STANDALONE:
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):  # 图像结束或扫描开始之前没有帧头
+            return None
+        if marker in _JPEG_SOF:
+            h, w = struct.unpack_from('>HH', data, i + 5)
+            return w, h
+        i += 2 + struct.unpack_from('>H', data, i + 2)[0]
+    return None
+
+
+def _png_size(data) -> Optional[Tuple[int, int]]:
+    """IHDR块中的宽高"""
+    if bytes(data[12:16]) != b'IHDR':
+        return None
+    return struct.unpack_from('>II', data, 16)
+
+
+def _gif_size(data) -> Tuple[int, int]:
+    """逻辑屏幕描述符中的宽高"""
+    return struct.unpack_from('<HH', data, 6)
+
+
+def _bmp_size(data) -> Tuple[int, int]:
+    """DIB头中的宽高（高度为负表示自上而下存储）"""
+    if struct.unpack_from('<I', data, 14)[0] == 12:  # OS/2 BITMAPCOREHEADER
+        return struct.unpack_from('<HH', data, 18)
+    w, h = struct.unpack_from('<ii', data, 18)
+    return w, abs(h)
+
+
+def _webp_size(data) -> Optional[Tuple[int, int]]:
+    """VP8（有损）、VP8L（无损）或VP8X（扩展）块中的宽高"""
+    chunk = bytes(data[12:16])
+    if chunk == b'VP8 ':
+        w, h = struct.unpack_from('<HH', data, 26)
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b'VP8L':
+        b = bytes(data[21:25])
+        return 1 + (b[0] | (b[1] & 0x3F) << 8), 1 + (b[1] >> 6 | b[2] << 2 | (b[3] & 0x0F) << 10)
+    if chunk == b'VP8X':
+        b = bytes(data[24:30])
+        return 1 + int.from_bytes(b[:3], 'little'), 1 + int.from_bytes(b[3:], 'little')
+    return None
+
+
+def _tiff_size(data) -> Optional[Tuple[int, int]]:
+    """第一个IFD中的ImageWidth(256)和ImageLength(257)标签"""
+    order = '<' if bytes(data[:2]) == b'II' else '>'
+    offset = struct.unpack_from(order + 'I', data, 4)[0]
+    count = struct.unpack_from(order + 'H', data, offset)[0]
+    size = {}
+    for k in range(count):
+        entry = offset + 2 + 12 * k
+        tag, typ = struct.unpack_from(order + 'HH', data, entry)
+        if tag in (256, 257):
+            size[tag] = struct.unpack_from(order + ('H' if typ == 3 else 'I'), data, entry + 8)[0]
+    if 256 not in size or 257 not in size:
+        return None
+    return size[256], size[257]
+
+
+_PARSERS = {
+    'jpeg': _jpeg_size,
+    'png': _png_size,
+    'gif': _gif_size,
+    'bmp': _bmp_size,
+    'webp': _webp_size,
+    'tiff': _tiff_size
+}
@@ -0,0 +1,173 @@
+"""
+文件保留策略模块
+后台线程按结果索引定期清理过期文件，同时限制保留文件的总大小
+"""
+import logging
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from config import config, RetentionConfig
+from storage import ResultStore, result_store
+
+
+class RetentionService:
+    """文件保留策略服务类"""
+
+    # 每次从索引中取出的条目数
+    BATCH_SIZE = 500
+
+    def __init__(self, retention_config: Optional[RetentionConfig] = None, store: Optional[ResultStore] = None):
+        """
+        初始化保留策略服务
+
+        Args:
+            retention_config: 保留策略配置对象，如果为None则使用默认配置
+            store: 结果存储，如果为None则使用全局结果存储
+        """
+        self.config = retention_config or config.retention
+        self.store = store or result_store
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.runs = 0
+        self.deleted_total = 0
+        self.reclaimed_bytes_total = 0
+        self.last_run = None
+
+    def start(self):
+        """登记历史遗留文件并启动后台清理线程（重复调用无副作用）"""
+        if not self.config.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self.import_legacy()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='retention', daemon=True)
+        self._thread.start()
+        self.logger.info(f"文件保留策略已启动: 每 {self.config.interval_seconds}s 清理一次, "
+                         f"最长保留 {self.config.max_age_hours}h, 总大小上限 {self.config.max_total_mb}MB")
+
+    def stop(self):
+        """停止后台清理线程"""
+        self._stop.set()
+
+    def run_once(self) -> dict:
+        """
+        执行一次清理：先删除过期条目，再按时间从早到晚删除超出总大小预算的条目
+
+        Returns:
+            本次清理统计：deleted_count、reclaimed_bytes、remaining_bytes
+        """
+        with self._lock:
+            start = time.time()
+            deleted, reclaimed = 0, 0
+
+            # 过期条目
+            cutoff = start - self.config.max_age_hours * 3600
+            while True:
+                rows = self.store.oldest(self.BATCH_SIZE, before=cutoff)
+                if not rows:
+                    break
+                n, size = self._delete(rows)
+                deleted, reclaimed = deleted + n, reclaimed + size
+
+            # 总大小预算
+            budget = self.config.max_total_mb * 1024 * 1024
+            total = self.store.total_size()
+            while total > budget:
+                rows = self.store.oldest(self.BATCH_SIZE)
+                if not rows:
+                    break
+                batch, excess = [], total - budget
+                for row in rows:
+                    batch.append(row)
+                    excess -= row[2]
+                    if excess <= 0:
+                        break
+                n, size = self._delete(batch)
+                deleted, reclaimed = deleted + n, reclaimed + size
+                total -= size
+
+            self.runs += 1
+            self.deleted_total += deleted
+            self.reclaimed_bytes_total += reclaimed
+            self.last_run = time.time()
+
+        if deleted:
+            self.logger.info(f"清理完成: 删除 {deleted} 个条目, 释放 {reclaimed / 1024 / 1024:.1f}MB, "
+                             f"耗时 {(time.time() - start) * 1E3:.1f}ms")
+        return {
+            'deleted_count': deleted,
+            'reclaimed_bytes': reclaimed,
+            'remaining_bytes': self.store.total_size()
+        }
+
+    def stats(self) -> dict:
+        """累计清理统计"""
+        return {
+            'runs': self.runs,
+            'deleted_total': self.deleted_total,
+            'reclaimed_bytes_total': self.reclaimed_bytes_total,
+            'last_run': self.last_run,
+            'entries': self.store.stats()
+        }
+
+    def import_legacy(self):
+        """
+        登记未纳入索引的历史文件（旧版的exp*结果目录和原图，以及进程中断时遗留的上传.part文件），只扫描一层目录
+        """
+        legacy = [(p, 'result') for p in config.results_path.glob('exp*') if p.is_dir()]
+        original_dir = config.static_path / 'images' / 'original'
+        if original_dir.exists():
+            legacy += [(p, 'original') for p in original_dir.iterdir() if p.is_file() and p.name != '__init__.py']
+        legacy += [(p, 'upload') for p in config.uploads_path.glob('*/*.part')]
+
+        count = 0
+        for path, kind in legacy:
+            if not self.store.contains_path(path):
+                self.store.register(path, kind, created=path.stat().st_mtime)
+                count += 1
+        if count:
+            self.logger.info(f"已登记 {count} 个历史文件")
+
+    def _delete(self, rows: list) -> tuple:
+        """删除条目对应的文件或目录，并清理空的分片目录"""
+        reclaimed = 0
+        for _, path, size in rows:
+            try:
+                # 文件已被其他途径删除时只清理索引，不计入释放的字节数
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                    self._remove_empty_parent(path)
+                    reclaimed += size
+                elif path.exists():
+                    path.unlink(missing_ok=True)
+                    reclaimed += size
+            except Exception as e:
+                self.logger.warning(f"删除文件失败: {path}: {e}")
+        self.store.remove([key for key, _, _ in rows])
+        return len(rows), reclaimed
+
+    def _remove_empty_parent(self, path: Path):
+        """结果目录删除后，如果所在分片目录已空则一并删除"""
+        if path.parent.parent == self.store.root:
+            try:
+                path.parent.rmdir()
+            except OSError:
+                pass
+
+    def _run(self):
+        """后台清理循环"""
+        while not self._stop.wait(self.config.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                self.logger.error(f"定时清理失败: {e}")
+
+
+# 全局保留策略服务实例
+retention_service = RetentionService()
@@ -0,0 +1,222 @@
+"""
+服务计划模块
+加载模型时一次性确定输入尺寸、步长、类别名称等元数据并预分配输入缓冲区，
+请求处理时只需把像素送入预处理器，不再逐请求推导配置
+"""
+import queue
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from utils.general import check_img_size, is_ascii
+
+from config import YOLOConfig
+from render import BoxRenderer
+
+
+class _Slot:
+    """预处理缓冲区：uint8 HWC画布（使用CUDA时为锁页内存）、设备端画布和归一化后的输入张量"""
+
+    def __init__(self, numel: int, dtype: torch.dtype, device: torch.device, pin_memory: bool):
+        cuda = device.type == 'cuda'
+        self.canvas = torch.empty(numel, dtype=torch.uint8, pin_memory=cuda and pin_memory)
+        self.canvas_np = self.canvas.numpy()
+        self.device_canvas = torch.empty(numel, dtype=torch.uint8, device=device) if cuda else None
+        self.input = torch.empty(numel, dtype=dtype, device=device)
+        # 上一次异步拷贝完成前不能改写锁页画布
+        self.copied = torch.cuda.Event() if cuda else None
+
+
+class Preprocessor:
+    """
+    预处理器类：letterbox、BGR转RGB、HWC转CHW并归一化，写入复用的输入缓冲区
+
+    原图直接缩放到画布中的目标区域，只填充边框，不产生中间图像；
+    通道重排和类型转换在逐通道拷贝中一次完成，归一化原地进行，不分配临时张量
+    """
+
+    # letterbox填充颜色
+    PAD_VALUE = 114
+
+    def __init__(self, imgsz: Tuple[int, int], stride: int, device: torch.device, fp16: bool,
+                 max_batch_size: int = 1, pool_size: int = 1, max_pool_size: int = 0, pin_memory: bool = True):
+        """
+        初始化预处理器并预分配输入缓冲区
+
+        Args:
+            imgsz: 固定输入尺寸 (h, w)，已按步长校验
+            stride: 模型最大步长
+            device: 模型所在设备
+            fp16: 模型是否使用半精度输入
+            max_batch_size: 单次推理的最大批大小，决定缓冲区容量
+            pool_size: 预分配的缓冲区个数
+            max_pool_size: 缓冲区个数上限，即可同时进行预处理和推理的调用数，0表示不限制
+            pin_memory: 使用CUDA时画布是否使用锁页内存（可异步拷贝到显存）
+        """
+        self.imgsz = imgsz
+        self.stride = stride
+        self.device = device
+        self.dtype = torch.half if fp16 else torch.float
+        self.pin_memory = pin_memory
+        self.capacity = max_batch_size * 3 * imgsz[0] * imgsz[1]
+
+        self.max_pool_size = max_pool_size
+        self._pool = queue.SimpleQueue()
+        self._pool_size = pool_size
+        self._lock = threading.Lock()
+        for _ in range(pool_size):
+            self._pool.put(self._new_slot(self.capacity))
+
+    @contextmanager
+    def acquire(self):
+        """
+        取出一个空闲的输入缓冲区，使用完毕后归还
+
+        缓冲区都在使用中时，未达到个数上限则新分配一个并留在池中复用（缓冲区个数随并发调用数增长一次），
+        已达到上限则等待其他调用归还
+        """
+        try:
+            slot = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                grow = not self.max_pool_size or self._pool_size < self.max_pool_size
+                self._pool_size += grow
+            slot = self._new_slot(self.capacity) if grow else self._pool.get()
+        try:
+            yield slot
+        finally:
+            self._pool.put(slot)
+
+    def fill(self, slot: Optional[_Slot], images: List[np.ndarray], auto: bool = False) -> torch.Tensor:
+        """
+        将一批原图预处理后写入缓冲区
+
+        Args:
+            slot: acquire得到的缓冲区，为None或容量不足时临时分配
+            images: BGR格式的原图列表
+            auto: 是否按步长取最小矩形（各图尺寸相同时才生效），否则统一填充到固定输入尺寸
+
+        Returns:
+            形状为 (n, 3, h, w) 的归一化输入张量，是缓冲区的视图
+        """
+        auto = auto and len({im.shape for im in images}) == 1
+        layouts = [self._layout(im0.shape[:2], auto) for im0 in images]
+        h, w = layouts[0][0]
+        numel = len(images) * 3 * h * w
+
+        if slot is None or numel > self.capacity:
+            slot = self._new_slot(numel)
+        if slot.copied is not None:
+            slot.copied.synchronize()
+
+        canvas = slot.canvas_np[:numel].reshape(len(images), h, w, 3)
+        for im0, dst, layout in zip(images, canvas, layouts):
+            self._letterbox_into(im0, dst, layout)
+
+        src = slot.canvas[:numel].view(len(images), h, w, 3)
+        if slot.device_canvas is not None:
+            # 以uint8拷贝到显存（数据量为float的1/4），归一化在GPU上完成
+            src = slot.device_canvas[:numel].view(len(images), h, w, 3).copy_(src, non_blocking=True)
+            slot.copied.record()
+
+        im = slot.input[:numel].view(len(images), 3, h, w)
+        for c in range(3):
+            im[:, c].copy_(src[..., 2 - c])  # BGR转RGB、HWC转CHW并转换类型
+        return im.div_(255)
+
+    def _new_slot(self, numel: int) -> _Slot:
+        """分配一个缓冲区"""
+        return _Slot(numel, self.dtype, self.device, self.pin_memory)
+
+    def _layout(self, shape: Tuple[int, int], auto: bool) -> tuple:
+        """
+        计算letterbox布局（与utils.augmentations.letterbox的取整方式一致）
+
+        Returns:
+            ((输出h, 输出w), (缩放后h, 缩放后w), (上边距, 左边距))
+        """
+        new_h, new_w = self.imgsz
+        r = min(new_h / shape[0], new_w / shape[1])
+        unpad_w, unpad_h = int(round(shape[1] * r)), int(round(shape[0] * r))
+        dw, dh = new_w - unpad_w, new_h - unpad_h
+        if auto:
+            dw, dh = np.mod(dw, self.stride), np.mod(dh, self.stride)
+        dw, dh = dw / 2, dh / 2
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        return (unpad_h + top + bottom, unpad_w + left + right), (unpad_h, unpad_w), (top, left)
+
+    def _letterbox_into(self, im0: np.ndarray, dst: np.ndarray, layout: tuple):
+        """将原图缩放到画布的目标区域，并填充四周边框"""
+        _, (h, w), (top, left) = layout
+        roi = dst[top:top + h, left:left + w]
+        if im0.shape[:2] == (h, w):
+            np.copyto(roi, im0)
+        else:
+            cv2.resize(im0, (w, h), dst=roi, interpolation=cv2.INTER_LINEAR)
+
+        dst[:top] = self.PAD_VALUE
+        dst[top + h:] = self.PAD_VALUE
+        dst[top:top + h, :left] = self.PAD_VALUE
+        dst[top:top + h, left + w:] = self.PAD_VALUE
+
+
+@dataclass(frozen=True)
+class ServingPlan:
+    """服务计划类（加载模型时创建，之后不再修改）"""
+    imgsz: Tuple[int, int]
+    stride: int
+    names: dict
+    pt: bool
+    fp16: bool
+    device: torch.device
+    max_batch_size: int
+    preprocessor: Preprocessor
+    # 批量绘制器，配置为逐框绘制或类别名称含非ASCII字符时为None
+    renderer: Optional[BoxRenderer]
+
+    @classmethod
+    def build(cls, model, yolo_config: YOLOConfig) -> 'ServingPlan':
+        """
+        根据已加载的模型和配置创建服务计划
+
+        Args:
+            model: 已加载的DetectMultiBackend模型
+            yolo_config: YOLO配置对象
+
+        Returns:
+            服务计划
+        """
+        stride = int(model.stride)
+        imgsz = tuple(check_img_size(yolo_config.imgsz, s=stride))
+        names = model.names if isinstance(model.names, dict) else dict(enumerate(model.names))
+        max_batch_size = max(yolo_config.batch_max_size, 1)
+        preprocessor = Preprocessor(
+            imgsz, stride, model.device, model.fp16,
+            max_batch_size=max_batch_size,
+            pool_size=max(yolo_config.max_concurrent_inference, 1),
+            max_pool_size=yolo_config.max_concurrent_inference,
+            pin_memory=yolo_config.pin_memory
+        )
+        renderer = None
+        if yolo_config.renderer == 'batched' and is_ascii(str(names)):
+            renderer = BoxRenderer(
+                dict(names), yolo_config.line_thickness,
+                hide_labels=yolo_config.hide_labels, hide_conf=yolo_config.hide_conf
+            )
+        return cls(
+            imgsz=imgsz,
+            stride=stride,
+            names=dict(names),
+            pt=model.pt,
+            fp16=model.fp16,
+            device=model.device,
+            max_batch_size=max_batch_size,
+            preprocessor=preprocessor,
+            renderer=renderer
+        )
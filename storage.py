@@ -0,0 +1,246 @@
+"""
+结果存储模块
+用UUID分配结果目录并按前缀分片，避免每次请求扫描结果目录寻找可用的expN；
+已写入磁盘的文件通过重命名或硬链接放到最终位置，不重复复制
+"""
+import errno
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from config import config
+from metrics import metrics
+
+PLACEMENTS_TOTAL = metrics.counter('yolo_file_placements_total', 'Files moved into place', ['method'])
+
+
+class ResultStore:
+    """结果存储类（分片目录 + SQLite索引）"""
+
+    def __init__(self, root: Optional[Path] = None, index_path: Optional[Path] = None):
+        """
+        初始化结果存储
+
+        Args:
+            root: 结果根目录，如果为None则使用 static/images/results
+            index_path: 索引数据库路径，如果为None则使用 instance/results.db
+        """
+        self.root = Path(root or config.results_path / 'results')
+        self.index_path = Path(index_path or config.instance_path / 'results.db')
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def allocate(self, kind: str = 'result', root: Optional[Path] = None) -> Tuple[str, Path]:
+        """
+        分配一个新的结果目录，耗时与已保留的结果数量无关
+
+        Args:
+            kind: 条目类型，如 'result'
+            root: 结果根目录，如果为None则使用默认目录
+
+        Returns:
+            (结果键, 已创建的结果目录)
+        """
+        key = uuid.uuid4().hex
+        path = Path(root or self.root) / key[:2] / key
+        path.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            self._connect().execute(
+                'INSERT INTO entries (key, kind, path, created, size) VALUES (?, ?, ?, ?, 0)',
+                (key, kind, str(path), time.time())
+            )
+        return key, path
+
+    def set_size(self, key: str, size: int):
+        """
+        记录条目占用的字节数
+
+        Args:
+            key: 结果键
+            size: 字节数
+        """
+        with self._lock:
+            self._connect().execute('UPDATE entries SET size = ? WHERE key = ?', (size, key))
+
+    def register(self, path: Path, kind: str, created: Optional[float] = None) -> str:
+        """
+        将已存在的文件或目录登记到索引，由保留策略统一清理
+
+        Args:
+            path: 文件或目录路径
+            kind: 条目类型，如 'original'、'upload'
+            created: 创建时间戳，如果为None则使用当前时间
+
+        Returns:
+            分配的条目键
+        """
+        key = uuid.uuid4().hex
+        path = Path(path)
+        size = path.stat().st_size if path.is_file() else _dir_size(path)
+        with self._lock:
+            self._connect().execute(
+                'INSERT INTO entries (key, kind, path, created, size) VALUES (?, ?, ?, ?, ?)',
+                (key, kind, str(path), created or time.time(), size)
+            )
+        return key
+
+    def move(self, src: Path, dst: Path, kind: str) -> str:
+        """
+        将已登记（或未登记）的文件移动到新位置，索引条目随之更新，不重复写入文件内容
+
+        Args:
+            src: 源文件路径
+            dst: 目标文件路径
+            kind: 移动后的条目类型，如 'original'
+
+        Returns:
+            实际使用的方式，见place_file
+        """
+        method = place_file(src, dst)
+        size = Path(dst).stat().st_size
+        with self._lock:
+            updated = self._connect().execute(
+                'UPDATE entries SET path = ?, kind = ?, size = ? WHERE path = ?',
+                (str(dst), kind, size, str(src))
+            ).rowcount
+        if not updated:
+            self.register(dst, kind)
+        return method
+
+    def unregister(self, path: Path):
+        """
+        从索引中删除路径对应的条目（不删除文件），文件已由调用方删除时调用，
+        否则条目的大小会一直计入总大小，直到过期
+
+        Args:
+            path: 已登记的文件或目录路径
+        """
+        with self._lock:
+            self._connect().execute('DELETE FROM entries WHERE path = ?', (str(path),))
+
+    def contains_path(self, path: Path) -> bool:
+        """判断路径是否已登记"""
+        with self._lock:
+            row = self._connect().execute('SELECT 1 FROM entries WHERE path = ?', (str(path),)).fetchone()
+        return row is not None
+
+    def oldest(self, limit: int, before: Optional[float] = None) -> List[Tuple[str, Path, int]]:
+        """
+        按创建时间从早到晚返回条目
+
+        Args:
+            limit: 最多返回的条目数
+            before: 只返回早于该时间戳的条目，为None时不限制
+
+        Returns:
+            [(条目键, 路径, 字节数), ...]
+        """
+        sql = 'SELECT key, path, size FROM entries'
+        params = ()
+        if before is not None:
+            sql += ' WHERE created < ?'
+            params = (before,)
+        sql += ' ORDER BY created LIMIT ?'
+        with self._lock:
+            rows = self._connect().execute(sql, params + (limit,)).fetchall()
+        return [(key, Path(path), size) for key, path, size in rows]
+
+    def remove(self, keys: List[str]):
+        """从索引中删除条目（不删除文件）"""
+        with self._lock:
+            self._connect().executemany('DELETE FROM entries WHERE key = ?', [(k,) for k in keys])
+
+    def stats(self) -> dict:
+        """按类型统计条目数和字节数"""
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind'
+            ).fetchall()
+        return {kind: {'count': count, 'bytes': size} for kind, count, size in rows}
+
+    def total_size(self) -> int:
+        """已登记条目的总字节数"""
+        with self._lock:
+            return self._connect().execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def get(self, key: str) -> Optional[Path]:
+        """
+        按结果键查询结果目录
+
+        Args:
+            key: 结果键
+
+        Returns:
+            结果目录，不存在时返回None
+        """
+        with self._lock:
+            row = self._connect().execute('SELECT path FROM entries WHERE key = ?', (key,)).fetchone()
+        return Path(row[0]) if row else None
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取索引连接，首次调用时建表（调用方持有锁）"""
+        if self._conn is None:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, kind TEXT NOT NULL, path TEXT NOT NULL, '
+                'created REAL NOT NULL, size INTEGER NOT NULL DEFAULT 0)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_created ON entries (created)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_path ON entries (path)')
+        return self._conn
+
+
+def place_file(src: Path, dst: Path, keep_source: bool = False) -> str:
+    """
+    将文件放到目标位置：同一文件系统内重命名（保留源文件时建立硬链接），
+    跨设备或文件系统不支持硬链接时退回复制
+
+    Args:
+        src: 源文件路径
+        dst: 目标文件路径，已存在时被覆盖
+        keep_source: 是否保留源文件
+
+    Returns:
+        实际使用的方式：'rename'、'hardlink' 或 'copy'
+    """
+    src, dst = Path(src), Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if keep_source:
+            dst.unlink(missing_ok=True)
+            os.link(src, dst)
+            method = 'hardlink'
+        else:
+            os.replace(src, dst)
+            method = 'rename'
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copyfile(src, dst)
+        if not keep_source:
+            src.unlink(missing_ok=True)
+        method = 'copy'
+    PLACEMENTS_TOTAL.inc(method=method)
+    return method
+
+
+def _dir_size(path: Path) -> int:
+    """目录下所有文件的总字节数"""
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+# 全局结果存储实例
+result_store = ResultStore()
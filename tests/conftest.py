@@ -0,0 +1,10 @@
+"""
+测试公共配置
+项目模块位于仓库根目录（YOLOv5项目目录下），测试从根目录导入
+"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
@@ -0,0 +1,101 @@
+"""
+批量检测测试：压缩包展开的大小预算、图片数上限，以及取走的压缩包文件的删除（不加载模型）
+"""
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from batch_detect import BatchDetector, _Budget
+from config import config
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """单个成员上限1MB，解压总量上限3MB"""
+    monkeypatch.setattr(config.app, 'max_upload_size_mb', 1)
+    monkeypatch.setattr(config.app, 'batch_max_extract_mb', 3)
+
+
+def _zip(members: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def _tar(members: dict) -> bytes:
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w:gz') as tf:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def test_budget_member_limit(limits):
+    budget = _Budget()
+    assert budget.check(MB) == ""
+    assert '文件过大' in budget.check(MB + 1)
+    assert not budget.exhausted
+
+
+def test_budget_total_limit(limits):
+    budget = _Budget()
+    for _ in range(3):
+        assert budget.check(MB) == ""
+        budget.consume(MB)
+    assert '解压后超过' in budget.check(1)
+    assert budget.exhausted
+
+
+@pytest.mark.parametrize('pack, fmt', [(_zip, 'zip'), (_tar, 'gz')])
+def test_archive_expansion_stops_at_budget(limits, pack, fmt):
+    members = {f'{k}.jpg': bytes([k]) * MB for k in range(5)}
+    members['big.jpg'] = b'\x00' * (MB + 1)
+    data = pack({'big.jpg': members.pop('big.jpg'), **members})
+    items = list(BatchDetector()._expand('a', ('archive', fmt), data))
+    assert [name for name, _, _ in items] == ['a/big.jpg', 'a/0.jpg', 'a/1.jpg', 'a/2.jpg', 'a/3.jpg']
+    assert '文件过大' in items[0][2]
+    assert [len(payload) for _, payload, _ in items[1:4]] == [MB] * 3
+    assert items[4][1] is None and '解压后超过' in items[4][2]
+
+
+def test_hidden_members_skipped():
+    data = _zip({'__MACOSX/._a.jpg': b'junk', '.DS_Store': b'junk', 'dir/a.jpg': b'a'})
+    items = list(BatchDetector()._expand('x.zip', ('archive', 'zip'), data))
+    assert items == [('x.zip/dir/a.jpg', b'a', "")]
+
+
+def test_corrupt_archive():
+    items = list(BatchDetector()._expand('x.zip', ('archive', 'zip'), b'PK\x03\x04' + b'\x00' * 64))
+    assert len(items) == 1 and items[0][1] is None and '无法解析' in items[0][2]
+
+
+def test_file_count_limit(monkeypatch):
+    monkeypatch.setattr(config.app, 'batch_max_files', 3)
+    archive = _zip({'b.jpg': b'b', 'c.jpg': b'c', 'd.jpg': b'd'})
+    uploads = [('a.jpg', ('image', 'jpeg'), b'a'), ('x.zip', ('archive', 'zip'), archive)]
+    items = list(BatchDetector().iter_images(uploads))
+    assert [name for name, _, _ in items] == ['a.jpg', 'x.zip/b.jpg', 'x.zip/c.jpg', 'x.zip/d.jpg']
+    assert items[-1][1] is None and '上限 3' in items[-1][2]
+
+
+def test_videos_rejected():
+    items = list(BatchDetector().iter_images([('v.mp4', ('video', 'mp4'), None)]))
+    assert items[0][1] is None and 'mp4' in items[0][2]
+
+
+def test_release_removes_spooled_archives(tmp_path):
+    path = tmp_path / 'upload.part'
+    path.write_bytes(_zip({'a.jpg': b'a'}))
+    uploads = [('x.zip', ('archive', 'zip'), path), ('a.jpg', ('image', 'jpeg'), b'a')]
+    detector = BatchDetector()
+    detector.release(uploads)
+    assert not path.exists()
+    detector.release(uploads)  # 可重复调用
@@ -0,0 +1,83 @@
+"""
+结果缓存测试：缓存键包含影响结果的检测参数、内存层和磁盘层按容量淘汰最久未使用的条目、磁盘层重启后恢复
+"""
+from dataclasses import replace
+
+import pytest
+
+from cache import KEY_FIELDS, ResultCache
+from config import CacheConfig, YOLOConfig
+
+MB = 1024 * 1024
+
+
+def _entry(image_bytes: int = 0) -> dict:
+    return {
+        'detections': [{'class_id': 0, 'conf': 0.9}],
+        'shape': (480, 640),
+        'image': b'x' * image_bytes if image_bytes else None,
+        'ext': '.jpg',
+        'encode': None,
+        'save_path': None,
+        'variants': None
+    }
+
+
+@pytest.mark.parametrize('field, value', [
+    ('conf_thres', 0.5), ('iou_thres', 0.6), ('imgsz', (320, 320)), ('classes', [0]), ('augment', True),
+    ('renderer', 'annotator'), ('line_thickness', 1), ('hide_labels', True), ('weights', 'yolov5m.pt')
+])
+def test_key_depends_on_detection_params(field, value):
+    assert field in KEY_FIELDS
+    base = YOLOConfig()
+    assert ResultCache.make_key(b'data', base) != ResultCache.make_key(b'data', replace(base, **{field: value}))
+
+
+def test_key_ignores_unrelated_params():
+    base = YOLOConfig()
+    assert ResultCache.make_key(b'data', base) == ResultCache.make_key(b'data', replace(base, num_workers=4))
+    assert ResultCache.make_key(b'data', base) != ResultCache.make_key(b'other', base)
+
+
+def test_memory_lru_eviction():
+    cache = ResultCache(CacheConfig(memory_max_mb=1))
+    cache.put('a', _entry(400 * 1024))
+    cache.put('b', _entry(400 * 1024))
+    assert cache.get('a') is not None  # a变为最近使用
+    cache.put('c', _entry(400 * 1024))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.stats()
+    assert stats['memory_entries'] == 2 and stats['memory_bytes'] <= MB
+    assert stats['misses'] == 1 and stats['memory_hits'] == 3
+
+
+def test_oversized_entry_not_kept_in_memory():
+    cache = ResultCache(CacheConfig(memory_max_mb=1))
+    cache.put('a', _entry(2 * MB))
+    assert cache.get('a') is None
+
+
+def test_require_image():
+    cache = ResultCache(CacheConfig())
+    cache.put('a', _entry())
+    assert cache.get('a', require_image=True) is None
+    assert cache.get('a') is not None
+
+
+def test_disk_layer_eviction_and_reload(tmp_path):
+    cfg = CacheConfig(memory_max_mb=0.1, disk_dir=str(tmp_path), disk_max_mb=1)
+    cache = ResultCache(cfg)
+    for key in ('a1', 'b1', 'c1'):
+        cache.put(key, _entry(400 * 1024))
+    assert not (tmp_path / 'a1' / 'a1.json').exists()
+    assert cache.stats()['disk_entries'] == 2 and cache.stats()['disk_bytes'] <= MB
+
+    entry = cache.get('b1', require_image=True)
+    assert entry is not None and len(entry['image']) == 400 * 1024 and entry['shape'] == (480, 640)
+    assert cache.stats()['disk_hits'] == 1
+
+    reloaded = ResultCache(cfg)
+    assert reloaded.get('a1') is None
+    assert reloaded.get('c1') is not None
+
@@ -0,0 +1,116 @@
+"""
+文件头探测测试：格式识别、只读文件头的尺寸解析，以及上传内容校验对伪装、损坏和解压炸弹的拒绝
+"""
+import io
+import struct
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from config import config
+from probe import SNIFF_BYTES, probe_image_size, sniff_type
+from utils_app import validate_content
+
+W, H = 457, 123
+
+
+def _ftyp(brand: bytes) -> bytes:
+    return b'\x00\x00\x00\x18ftyp' + brand + b'\x00\x00\x00\x00' + brand + b'\x00' * 64
+
+
+@pytest.fixture(scope='module')
+def image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (H, W, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('ext, fmt', [
+    ('.jpg', 'jpeg'), ('.png', 'png'), ('.bmp', 'bmp'), ('.tiff', 'tiff'), ('.webp', 'webp')
+])
+def test_encoded_images(image, ext, fmt):
+    data = cv2.imencode(ext, image)[1].tobytes()
+    assert sniff_type(data[:SNIFF_BYTES]) == ('image', fmt)
+    assert probe_image_size(data) == (W, H)
+
+
+def test_lossless_webp(image):
+    data = cv2.imencode('.webp', image, [cv2.IMWRITE_WEBP_QUALITY, 101])[1].tobytes()
+    assert probe_image_size(data) == (W, H)
+
+
+def test_gif():
+    buf = io.BytesIO()
+    Image.new('RGB', (W, H)).save(buf, 'GIF')
+    assert probe_image_size(buf.getvalue()) == (W, H)
+
+
+def test_jpeg_size_after_large_app_segment():
+    buf = io.BytesIO()
+    Image.new('RGB', (W, H)).save(buf, 'JPEG', exif=b'Exif\x00\x00' + b'\x00' * 30000, progressive=True)
+    assert probe_image_size(memoryview(buf.getvalue())) == (W, H)
+
+
+@pytest.mark.parametrize('head, expected', [
+    (_ftyp(b'isom'), ('video', 'mp4')),
+    (_ftyp(b'mp42'), ('video', 'mp4')),
+    (_ftyp(b'qt  '), ('video', 'mov')),
+    (_ftyp(b'3gp5'), ('video', 'mp4')),
+    (_ftyp(b'heic'), ('image', 'heic')),
+    (_ftyp(b'mif1'), ('image', 'heif')),
+    (_ftyp(b'avif'), ('image', 'avif')),
+    (_ftyp(b'M4A '), None),
+    (b'RIFF\x00\x00\x00\x00AVI LIST', ('video', 'avi')),
+    (b'\x1a\x45\xdf\xa3' + b'\x00' * 16, ('video', 'mkv')),
+    (b'PK\x03\x04' + b'\x00' * 16, ('archive', 'zip')),
+    (b'\x1f\x8b\x08' + b'\x00' * 16, ('archive', 'gz')),
+    (b'\x00' * 257 + b'ustar\x0000', ('archive', 'tar')),
+    (b'hello world', None),
+])
+def test_sniff_type(head, expected):
+    assert sniff_type(head) == expected
+
+
+@pytest.mark.parametrize('data', [
+    b'\xff\xd8\xff\xe0' + b'\x00' * 100,  # 段长度为0，找不到帧头
+    b'\xff\xd8\xff\xda' + b'\x00' * 100,  # 帧头之前开始扫描
+    b'\x89PNG\r\n\x1a\n' + b'\x00' * 4 + b'XXXX' + b'\x00' * 16,  # 第一个块不是IHDR
+])
+def test_corrupt_headers(data):
+    assert probe_image_size(data) is None
+
+
+def test_valid_image_accepted(image):
+    data = cv2.imencode('.png', image)[1].tobytes()
+    assert validate_content(data) == (True, "")
+
+
+def test_decompression_bomb_rejected():
+    png = cv2.imencode('.png', np.zeros((10, 10, 3), np.uint8))[1].tobytes()
+    side = config.app.max_image_side - 1
+    bomb = png[:16] + struct.pack('>II', side, side) + png[24:]
+    assert side * side > config.app.max_image_pixels
+    ok, message = validate_content(bomb)
+    assert not ok and '尺寸' in message
+
+
+def test_oversized_side_rejected():
+    png = cv2.imencode('.png', np.zeros((10, 10, 3), np.uint8))[1].tobytes()
+    wide = png[:16] + struct.pack('>II', config.app.max_image_side + 1, 1) + png[24:]
+    assert not validate_content(wide)[0]
+
+
+def test_corrupt_image_rejected():
+    ok, message = validate_content(b'\xff\xd8\xff\xe0' + b'\x00' * 100)
+    assert not ok and '损坏' in message
+
+
+@pytest.mark.parametrize('head', [_ftyp(b'heic'), _ftyp(b'avif'), b'hello world' * 10])
+def test_unsupported_content_rejected(head):
+    assert not validate_content(head)[0]
+
+
+def test_kind_filter():
+    assert not validate_content(_ftyp(b'isom'), kinds={'image'})[0]
+    assert validate_content(_ftyp(b'isom'))[0]
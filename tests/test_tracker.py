@@ -0,0 +1,108 @@
+"""
+目标跟踪测试：同类检测按IoU关联到已有轨迹、轨迹超龄删除、无推理帧的推算，以及按来源重置跟踪器
+"""
+import numpy as np
+import torch
+
+from tracker import SortTracker, TrackerSet
+
+
+def _det(*boxes):
+    """(x1, y1, x2, y2, cls) 列表转换为 (n, 6) 检测结果，置信度固定为0.9"""
+    return np.array([[x1, y1, x2, y2, 0.9, cls] for x1, y1, x2, y2, cls in boxes], dtype=np.float64).reshape(-1, 6)
+
+
+def test_ids_follow_moving_objects():
+    tracker = SortTracker()
+    ids = None
+    for step in range(10):
+        dx = 5 * step
+        out = tracker.update(_det((10 + dx, 10, 60 + dx, 80, 0), (300 - dx, 200, 350 - dx, 260, 1)))
+        if ids is None:
+            ids = out[:, 6].tolist()
+        assert out[:, 6].tolist() == ids
+    assert ids == [1, 2]
+
+
+def test_output_keeps_input_order():
+    tracker = SortTracker()
+    tracker.update(_det((0, 0, 50, 50, 0), (100, 100, 150, 150, 0)))
+    out = tracker.update(_det((100, 100, 150, 150, 0), (0, 0, 50, 50, 0)))
+    assert out[:, 6].tolist() == [2, 1]
+    np.testing.assert_array_equal(out[:, :4], [[100, 100, 150, 150], [0, 0, 50, 50]])
+
+
+def test_class_mismatch_starts_new_track():
+    tracker = SortTracker()
+    tracker.update(_det((10, 10, 60, 60, 0)))
+    out = tracker.update(_det((10, 10, 60, 60, 2)))
+    assert out[:, 6].tolist() == [2]
+
+
+def test_low_iou_starts_new_track():
+    tracker = SortTracker(iou_threshold=0.3)
+    tracker.update(_det((10, 10, 60, 60, 0)))
+    out = tracker.update(_det((200, 200, 250, 250, 0)))
+    assert out[:, 6].tolist() == [2]
+
+
+def test_tracks_age_out():
+    tracker = SortTracker(max_age=3)
+    tracker.update(_det((10, 10, 60, 60, 0)))
+    for _ in range(3):
+        tracker.update(_det())
+    assert len(tracker.tracks) == 1
+    tracker.update(_det())
+    assert tracker.tracks == []
+    assert tracker.update(_det((10, 10, 60, 60, 0)))[:, 6].tolist() == [2]
+
+
+def test_recovers_after_short_gap():
+    tracker = SortTracker(max_age=5)
+    tracker.update(_det((10, 10, 60, 60, 0)))
+    tracker.update(_det())
+    tracker.update(_det())
+    assert tracker.update(_det((10, 10, 60, 60, 0)))[:, 6].tolist() == [1]
+
+
+def test_predict_only_reports_tracks_matched_at_last_detection():
+    tracker = SortTracker()
+    tracker.update(_det((10, 10, 60, 60, 0), (200, 200, 260, 260, 1)))
+    tracker.update(_det((12, 10, 62, 60, 0)))  # 第二个目标本帧未检测到
+    out = tracker.predict()
+    assert out.shape == (1, 7)
+    assert out[0, 5] == 0 and out[0, 6] == 1
+    assert tracker.predict()[:, 6].tolist() == [1]
+
+
+def test_predict_extrapolates_motion():
+    tracker = SortTracker()
+    for step in range(8):
+        tracker.update(_det((10 + 10 * step, 10, 60 + 10 * step, 60, 0)))
+    last_x1 = 10 + 10 * 7
+    box = tracker.predict()[0, :4]
+    assert last_x1 < box[0] < last_x1 + 20
+
+
+def test_empty_inputs():
+    tracker = SortTracker()
+    assert tracker.update(_det()).shape == (0, 7)
+    assert tracker.predict().shape == (0, 7)
+
+
+def test_tracker_set_resets_on_new_source():
+    trackers = TrackerSet()
+    det = torch.tensor([[10, 10, 60, 60, 0.9, 0]])
+    assert trackers.update(0, 'a.mp4', det)[:, 6].tolist() == [1]
+    assert trackers.update(1, 'cam1', det)[:, 6].tolist() == [1]  # 每路画面独立编号
+    trackers.update(0, 'a.mp4', torch.tensor([[200, 200, 260, 260, 0.9, 0]]))
+    assert trackers.update(0, 'b.mp4', det)[:, 6].tolist() == [1]
+
+
+def test_tracker_set_predict_clips_to_image():
+    trackers = TrackerSet()
+    for step in range(6):
+        trackers.update(0, 'a.mp4', torch.tensor([[500 + 20 * step, 10, 630 + 20 * step, 60, 0.9, 0]]))
+    out = trackers.predict(0, 'a.mp4', (480, 640))
+    assert out.dtype == torch.float32
+    assert out[0, 2] <= 640
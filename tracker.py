@@ -0,0 +1,212 @@
+"""
+目标跟踪模块
+SORT风格的多目标跟踪：每条轨迹一个匀速模型的卡尔曼滤波器，检测结果与轨迹的预测框按IoU贪心匹配（只匹配同类），
+只依赖NumPy；视频可以每隔几帧推理一次，中间帧由跟踪器推算边界框
+"""
+from typing import Dict, Tuple
+
+import numpy as np
+import torch
+
+from utils.general import clip_boxes
+
+from metrics import metrics
+
+TRACKED_FRAMES_TOTAL = metrics.counter(
+    'yolo_tracked_frames_total', 'Video frames processed with tracking', ['result']
+)
+TRACKS_TOTAL = metrics.counter('yolo_tracks_total', 'Tracks created by the tracker')
+
+# 匀速模型：状态 [cx, cy, s, r, vcx, vcy, vs]（s为面积，r为宽高比，假设宽高比不变），观测 [cx, cy, s, r]
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1
+_H = np.eye(4, 7)
+_Q = np.eye(7)
+_Q[4:, 4:] *= 0.01
+_Q[-1, -1] *= 0.01
+_R = np.eye(4)
+_R[2:, 2:] *= 10
+
+
+def _to_z(box: np.ndarray) -> np.ndarray:
+    """xyxy转换为观测 [cx, cy, s, r]"""
+    w, h = box[2] - box[0], box[3] - box[1]
+    return np.array([box[0] + w / 2, box[1] + h / 2, w * h, w / max(h, 1e-6)])
+
+
+def _to_xyxy(x: np.ndarray) -> np.ndarray:
+    """状态转换为xyxy"""
+    w = np.sqrt(max(x[2] * x[3], 0))
+    h = x[2] / w if w > 0 else 0
+    return np.array([x[0] - w / 2, x[1] - h / 2, x[0] + w / 2, x[1] + h / 2])
+
+
+def _iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """两组xyxy框的IoU矩阵 (len(a), len(b))"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-7)
+
+
+class Track:
+    """单条轨迹"""
+
+    def __init__(self, track_id: int, box: np.ndarray, conf: float, cls: float):
+        self.track_id = track_id
+        self.conf = conf
+        self.cls = cls
+        self.x = np.zeros(7)
+        self.x[:4] = _to_z(box)
+        self.P = np.eye(7) * 10
+        self.P[4:, 4:] *= 1000  # 初始速度未知
+        self.misses = 0  # 连续未匹配到检测的帧数
+
+    def predict(self) -> np.ndarray:
+        """推进一帧，返回预测框xyxy"""
+        if self.x[2] + self.x[6] <= 0:
+            self.x[6] = 0
+        self.x = _F @ self.x
+        self.P = _F @ self.P @ _F.T + _Q
+        self.misses += 1
+        return _to_xyxy(self.x)
+
+    def update(self, box: np.ndarray, conf: float):
+        """用匹配到的检测框校正状态"""
+        y = _to_z(box) - _H @ self.x
+        S = _H @ self.P @ _H.T + _R
+        K = self.P @ _H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(7) - K @ _H) @ self.P
+        self.conf = conf
+        self.misses = 0
+
+
+class SortTracker:
+    """单个视频（或摄像头画面）的多目标跟踪器"""
+
+    def __init__(self, max_age: int = 30, iou_threshold: float = 0.3):
+        """
+        初始化跟踪器
+
+        Args:
+            max_age: 轨迹连续未匹配到检测的帧数超过该值后删除
+            iou_threshold: 检测框与轨迹预测框匹配的最小IoU
+        """
+        self.max_age = max_age
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self._next_id = 1
+        self._gap = 0  # 上次检测之后推算的帧数
+
+    def update(self, det: np.ndarray) -> np.ndarray:
+        """
+        推进一帧并用该帧的检测结果更新轨迹，未匹配的检测开始新轨迹
+
+        Args:
+            det: 检测结果 (n, 6)：xyxy、置信度、类别
+
+        Returns:
+            (n, 7)，按输入顺序在末尾加一列track_id
+        """
+        predicted = np.array([t.predict() for t in self.tracks]).reshape(-1, 4)
+        ids = np.zeros(len(det))
+        unmatched = set(range(len(det)))
+
+        if len(det) and len(self.tracks):
+            iou = _iou(det[:, :4], predicted)
+            iou[det[:, 5][:, None] != np.array([t.cls for t in self.tracks])[None]] = 0
+            for _ in range(min(iou.shape)):
+                i, j = np.unravel_index(iou.argmax(), iou.shape)
+                if iou[i, j] < self.iou_threshold:
+                    break
+                self.tracks[j].update(det[i, :4], det[i, 4])
+                ids[i] = self.tracks[j].track_id
+                unmatched.discard(i)
+                iou[i, :] = 0
+                iou[:, j] = 0
+
+        for i in sorted(unmatched):
+            track = Track(self._next_id, det[i, :4], det[i, 4], det[i, 5])
+            self.tracks.append(track)
+            ids[i] = track.track_id
+            self._next_id += 1
+        TRACKS_TOTAL.inc(len(unmatched))
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_age]
+        self._gap = 0
+        return np.concatenate([det[:, :6], ids[:, None]], axis=1)
+
+    def predict(self) -> np.ndarray:
+        """
+        推进一帧（该帧没有检测结果）
+
+        Returns:
+            (m, 7)：上次检测时匹配到的轨迹的预测框，置信度和类别沿用上次检测，末列为track_id
+        """
+        self._gap += 1
+        rows = []
+        for track in self.tracks:
+            box = track.predict()
+            if track.misses == self._gap:
+                rows.append([*box, track.conf, track.cls, track.track_id])
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_age]
+        return np.array(rows).reshape(-1, 7)
+
+
+class TrackerSet:
+    """按输入源分别维护跟踪器：键为画面序号（多路摄像头），来源路径变化（切换到下一个视频）时重新开始"""
+
+    def __init__(self, max_age: int = 30, iou_threshold: float = 0.3):
+        """
+        初始化跟踪器集合
+
+        Args:
+            max_age: 见SortTracker
+            iou_threshold: 见SortTracker
+        """
+        self.max_age = max_age
+        self.iou_threshold = iou_threshold
+        self._trackers: Dict[int, Tuple[str, SortTracker]] = {}
+
+    def _get(self, key: int, source: str) -> SortTracker:
+        entry = self._trackers.get(key)
+        if entry is None or entry[0] != source:
+            entry = self._trackers[key] = (source, SortTracker(self.max_age, self.iou_threshold))
+        return entry[1]
+
+    def update(self, key: int, source: str, det: torch.Tensor) -> torch.Tensor:
+        """
+        用一帧的检测结果更新跟踪器
+
+        Args:
+            key: 画面序号
+            source: 来源路径
+            det: 已缩放到原图坐标的检测结果 (n, 6)
+
+        Returns:
+            (n, 7)，末列为track_id
+        """
+        TRACKED_FRAMES_TOTAL.inc(result='detected')
+        tracked = self._get(key, source).update(det.cpu().numpy().astype(np.float64))
+        return torch.from_numpy(tracked).float()
+
+    def predict(self, key: int, source: str, shape: tuple) -> torch.Tensor:
+        """
+        推算没有推理的一帧的检测结果
+
+        Args:
+            key: 画面序号
+            source: 来源路径
+            shape: 原图尺寸
+
+        Returns:
+            (m, 7)，边界框裁剪到图像范围内，末列为track_id
+        """
+        TRACKED_FRAMES_TOTAL.inc(result='propagated')
+        det = torch.from_numpy(self._get(key, source).predict()).float()
+        if len(det):
+            clip_boxes(det[:, :4], shape)
+        return det
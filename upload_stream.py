@@ -0,0 +1,182 @@
+"""
+上传流处理模块
+multipart解析器边接收边写入上传流：逐块累计大小并在超限时立即中止，同时计算内容哈希、
+根据文件头识别类型；图片留在内存中直接解码，视频和压缩包直接写入上传目录，不经过werkzeug的临时文件
+"""
+import hashlib
+import io
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from config import config
+from probe import SNIFF_BYTES, sniff_type
+
+
+class UploadStream:
+    """
+    上传文件流
+
+    解析器写入的前SNIFF_BYTES字节先缓存，据此识别类型后决定存放位置：
+    视频和压缩包写入上传目录下的.part文件（视频之后由save_uploaded_file重命名，不再复制），其余留在内存中
+    """
+
+    def __init__(self, filename: Optional[str] = None, max_bytes: Optional[int] = None,
+                 spool_dir: Optional[Path] = None, archive_max_bytes: Optional[int] = None):
+        """
+        初始化上传流
+
+        Args:
+            filename: 客户端提交的文件名
+            max_bytes: 单个文件的大小上限（字节），超出时中止请求，为None时不限制
+            spool_dir: 视频和压缩包的写入目录，如果为None则分别使用 uploads/videos 和 uploads/archives
+            archive_max_bytes: 压缩包的大小上限（字节，压缩包写入磁盘，不占用内存），为None时与max_bytes相同
+        """
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.archive_max_bytes = archive_max_bytes
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self.kind = None  # 'image' / 'video' / 'archive'，无法识别时为None
+        self.format = None  # 识别出的格式，如 'jpeg'、'mp4'
+        self.path = None  # 写入磁盘时的文件路径
+        self._head = bytearray()
+        self._file = None
+
+    def write(self, data: bytes) -> int:
+        """写入一块数据（由multipart解析器调用）"""
+        self.size += len(data)
+        max_bytes = self.max_bytes
+        if self.kind == 'archive' and self.archive_max_bytes is not None:
+            max_bytes = self.archive_max_bytes
+        if max_bytes is not None and self.size > max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f"文件超过 {max_bytes // (1024 * 1024)}MB")
+        self.hasher.update(data)
+        if self._file is not None:
+            return self._file.write(data)
+        self._head += data
+        if len(self._head) >= SNIFF_BYTES:
+            self._open()
+        return len(data)
+
+    def _open(self):
+        """按文件头确定存放位置，写入已缓存的数据"""
+        self.kind, self.format = sniff_type(bytes(self._head[:SNIFF_BYTES])) or (None, None)
+        if self.kind in ('video', 'archive'):
+            spool_dir = self.spool_dir or config.uploads_path / ('videos' if self.kind == 'video' else 'archives')
+            spool_dir.mkdir(parents=True, exist_ok=True)
+            self.path = spool_dir / f'{uuid.uuid4().hex}.part'
+            self._file = open(self.path, 'w+b')
+        else:
+            self._file = io.BytesIO()
+        self._file.write(self._head)
+        self._head = bytearray()
+
+    def _stream(self):
+        """底层文件对象，数据不足以识别类型时也在此确定存放位置"""
+        if self._file is None:
+            self._open()
+        return self._file
+
+    @property
+    def sniffed(self) -> Optional[tuple]:
+        """文件头识别结果 (类别, 格式)，无法识别时为None"""
+        self._stream()
+        return (self.kind, self.format) if self.kind else None
+
+    @property
+    def in_memory(self) -> bool:
+        """数据是否保存在内存中"""
+        return isinstance(self._stream(), io.BytesIO)
+
+    def getbuffer(self) -> memoryview:
+        """内存中数据的只读视图（不复制），仅in_memory为True时可用"""
+        return self._stream().getbuffer().toreadonly()
+
+    def detach(self) -> Path:
+        """
+        取走已写入磁盘的文件，之后关闭流时不再删除该文件
+
+        Returns:
+            文件路径，仅in_memory为False时可用
+        """
+        self._stream().close()
+        path, self.path = self.path, None
+        return path
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream().read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._stream().readline(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._stream().seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._stream().tell()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._file is not None and self._file.closed
+
+    def close(self):
+        """关闭流，未被取走的磁盘文件一并删除（请求结束时由werkzeug调用）"""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except BufferError:  # getbuffer的视图仍被引用，内存随视图一并释放
+                pass
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self.path = None
+
+
+class UploadRequest(Request):
+    """使用UploadStream接收上传文件的请求类"""
+
+    # 单个文件的大小上限（字节），为None时使用AppConfig.max_upload_size_mb；
+    # 压缩包的大小上限，为None时与单个文件相同；视图可在读取表单前按需放宽
+    max_file_size: Optional[int] = None
+    max_archive_size: Optional[int] = None
+
+    def _get_file_stream(self, total_content_length: Optional[int], content_type: Optional[str],
+                         filename: Optional[str] = None, content_length: Optional[int] = None) -> UploadStream:
+        return UploadStream(filename, max_bytes=self.max_file_size or config.app.max_upload_size_mb * 1024 * 1024,
+                            archive_max_bytes=self.max_archive_size)
+
+
+def upload_bytes(file) -> tuple:
+    """
+    取出上传文件的内容
+
+    Args:
+        file: 上传的文件对象
+
+    Returns:
+        (文件内容, 已累计的内容哈希)；由UploadStream接收且在内存中时不复制数据，
+        否则读取整个文件，哈希为None
+    """
+    stream = file.stream
+    if isinstance(stream, UploadStream) and stream.in_memory:
+        return stream.getbuffer(), stream.hasher
+    file.seek(0)
+    return file.read(), None
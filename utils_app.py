@@ -4,6 +4,7 @@
 """
 import logging
 import os
+import shutil
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -13,6 +14,12 @@ from werkzeug.utils import secure_filename
 from flask import current_app
 
 from config import config
+from metrics import metrics, stage_timer
+from probe import SNIFF_BYTES, probe_image_size, sniff_type
+from storage import place_file, result_store
+from upload_stream import UploadStream
+
+UPLOAD_REJECTIONS_TOTAL = metrics.counter('yolo_upload_rejections_total', 'Uploads rejected by validation', ['reason'])
 
 
 class FileManager:
@@ -38,6 +45,38 @@ class FileManager:
         return '.' in filename and \
                filename.rsplit('.', 1)[1].lower() in allowed_extensions
     
+    def sniff(self, file) -> Optional[Tuple[str, str]]:
+        """
+        按文件头识别上传文件的真实类型
+
+        Args:
+            file: 上传的文件对象
+
+        Returns:
+            (类别, 格式)，如 ('video', 'mp4')，无法识别时返回None
+        """
+        if isinstance(file.stream, UploadStream):
+            return file.stream.sniffed
+        return sniff_type(self.read_head(file, SNIFF_BYTES))
+
+    def read_head(self, file, limit: int = 256 * 1024) -> bytes:
+        """
+        读取上传文件开头的字节用于探测，之后重置文件指针
+
+        Args:
+            file: 上传的文件对象
+            limit: 最多读取的字节数；内存中的UploadStream直接返回全部内容的视图，不复制
+
+        Returns:
+            文件开头的字节
+        """
+        if isinstance(file.stream, UploadStream) and file.stream.in_memory:
+            return file.stream.getbuffer()
+        file.seek(0)
+        head = file.read(limit)
+        file.seek(0)
+        return head
+
     def generate_unique_filename(self, original_filename: str) -> str:
         """
         生成唯一的文件名
@@ -57,13 +96,14 @@ class FileManager:
         else:
             return f"{timestamp}_{unique_id}"
     
-    def save_uploaded_file(self, file, subdirectory: str = '') -> Optional[Path]:
+    def save_uploaded_file(self, file, subdirectory: str = '', extension: Optional[str] = None) -> Optional[Path]:
         """
         保存上传的文件
         
         Args:
             file: 上传的文件对象
             subdirectory: 子目录名称
+            extension: 保存使用的扩展名（如按文件头识别出的格式），如果为None则沿用上传文件名的扩展名
             
         Returns:
             保存的文件路径，失败时返回None
@@ -83,11 +123,19 @@ class FileManager:
             
             # 生成安全的文件名
             filename = secure_filename(file.filename)
+            if extension:
+                filename = f"{Path(filename).stem or 'upload'}.{extension}"
             unique_filename = self.generate_unique_filename(filename)
             file_path = save_dir / unique_filename
             
-            # 保存文件
-            file.save(str(file_path))
+            # 保存文件，并登记到索引，处理中断遗留的上传文件由保留策略清理；
+            # 接收时已写入上传目录的文件只需重命名
+            with stage_timer('upload_save'):
+                if isinstance(file.stream, UploadStream) and not file.stream.in_memory:
+                    place_file(file.stream.detach(), file_path)
+                else:
+                    file.save(str(file_path))
+            result_store.register(file_path, 'upload')
             self.logger.info(f"文件保存成功: {file_path}")
             
             return file_path
@@ -95,41 +143,23 @@ class FileManager:
         except Exception as e:
             self.logger.error(f"文件保存失败: {e}")
             return None
-    
-    def cleanup_old_files(self, directory: Path, max_age_hours: int = 24) -> int:
+
+    def discard(self, path: Optional[Path]):
         """
-        清理旧文件
-        
+        删除已登记的上传文件、原图或结果目录，并从索引中移除对应条目
+
         Args:
-            directory: 要清理的目录
-            max_age_hours: 文件最大保留时间（小时）
-            
-        Returns:
-            删除的文件数量
+            path: 文件或目录路径，为None时不做任何事
         """
-        try:
-            if not directory.exists():
-                return 0
-            
-            deleted_count = 0
-            current_time = datetime.now().timestamp()
-            max_age_seconds = max_age_hours * 3600
-            
-            for file_path in directory.rglob('*'):
-                if file_path.is_file():
-                    file_age = current_time - file_path.stat().st_mtime
-                    if file_age > max_age_seconds:
-                        file_path.unlink()
-                        deleted_count += 1
-                        self.logger.info(f"清理旧文件: {file_path}")
-            
-            self.logger.info(f"清理完成，共删除 {deleted_count} 个文件")
-            return deleted_count
-            
-        except Exception as e:
-            self.logger.error(f"文件清理失败: {e}")
-            return 0
-    
+        if path is None:
+            return
+        path = Path(path)
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+        result_store.unregister(path)
+
     def get_result_url(self, result_path: Path) -> Optional[str]:
         """
         获取结果文件的URL
@@ -177,6 +207,9 @@ def validate_image_file(file, max_size_mb: int = None) -> Tuple[bool, str]:
     """
     验证图片文件（增强版）
     
+    依次检查扩展名、文件大小、文件头识别出的真实格式，图片还检查文件头中的像素尺寸；
+    全部检查只读取文件头，不解码
+    
     Args:
         file: 文件对象
         max_size_mb: 最大文件大小（MB），None则使用配置中的值
@@ -189,18 +222,63 @@ def validate_image_file(file, max_size_mb: int = None) -> Tuple[bool, str]:
     
     # 使用全局 file_manager 实例（避免重复创建）
     if not file_manager.validate_file_type(file.filename):
+        UPLOAD_REJECTIONS_TOTAL.inc(reason='extension')
         return False, f"不支持的文件类型。支持的类型: {', '.join(config.app.allowed_extensions)}"
     
-    # 验证文件大小（在内存中检查，避免保存后才发现超限）
+    # 验证文件大小（在内存中检查，避免保存后才发现超限）；UploadStream接收时已累计大小
     max_size = (max_size_mb or config.app.max_upload_size_mb) * 1024 * 1024
-    file.seek(0, 2)  # 移动到文件末尾
-    file_size = file.tell()
-    file.seek(0)  # 重置文件指针
+    if isinstance(file.stream, UploadStream):
+        file_size = file.stream.size
+    else:
+        file.seek(0, 2)  # 移动到文件末尾
+        file_size = file.tell()
+        file.seek(0)  # 重置文件指针
     
     if file_size > max_size:
         size_mb = file_size / (1024 * 1024)
+        UPLOAD_REJECTIONS_TOTAL.inc(reason='size')
         return False, f"文件过大 ({size_mb:.2f}MB)，最大允许 {max_size_mb or config.app.max_upload_size_mb}MB"
     
+    # 按文件头识别真实格式，不信任扩展名
+    return validate_content(file_manager.read_head(file), file_manager.sniff(file))
+
+
+def validate_content(head, sniffed: Optional[Tuple[str, str]] = None,
+                     kinds: Optional[set] = None) -> Tuple[bool, str]:
+    """
+    按文件头验证文件内容：识别出的真实格式需在允许范围内，图片还需能从文件头读出不超限的像素尺寸
+    
+    Args:
+        head: 文件开头的字节（图片需包含到尺寸信息为止的文件头），可以是memoryview
+        sniffed: 已识别出的(类别, 格式)，如果为None则由head识别
+        kinds: 允许的类别集合，如果为None则图片和视频均允许
+        
+    Returns:
+        (是否有效, 错误消息)
+    """
+    if sniffed is None:
+        sniffed = sniff_type(bytes(head[:SNIFF_BYTES]))
+    if sniffed is None:
+        UPLOAD_REJECTIONS_TOTAL.inc(reason='unknown_format')
+        return False, "不支持的文件内容：无法识别文件格式"
+    kind, fmt = sniffed
+    allowed = config.app.allowed_extensions
+    if (fmt not in allowed and not (fmt == 'jpeg' and 'jpg' in allowed)) or (kinds and kind not in kinds):
+        UPLOAD_REJECTIONS_TOTAL.inc(reason='format')
+        return False, f"不支持的文件格式: {fmt}"
+    
+    # 图片只解析文件头得到像素尺寸，损坏的文件和解压炸弹在解码前拒绝
+    if kind == 'image':
+        size = probe_image_size(head, fmt)
+        if size is None:
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='corrupt')
+            return False, f"不支持的图片：{fmt}文件头损坏，无法读取尺寸"
+        w, h = size
+        if max(w, h) > config.app.max_image_side or w * h > config.app.max_image_pixels:
+            UPLOAD_REJECTIONS_TOTAL.inc(reason='dimensions')
+            return False, (f"不支持的图片尺寸 {w}x{h}，单边最大 {config.app.max_image_side}像素，"
+                           f"总像素最多 {config.app.max_image_pixels}")
+    
     return True, ""
 
 
@@ -247,6 +325,22 @@ def format_response(success: bool, message: str, data: Optional[dict] = None) ->
     return response
 
 
+def parse_bool(value: Optional[str], default: bool = False) -> bool:
+    """
+    解析请求参数中的布尔值
+    
+    Args:
+        value: 参数字符串，如 'true'、'0'、'no'
+        default: 参数缺失时的默认值
+        
+    Returns:
+        解析后的布尔值
+    """
+    if value is None or value == '':
+        return default
+    return value.strip().lower() not in ('0', 'false', 'no', 'off')
+
+
 def get_file_size_mb(file_path: Union[str, Path]) -> float:
     """
     获取文件大小（MB）
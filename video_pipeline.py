@@ -0,0 +1,190 @@
+"""
+视频流水线模块
+解码、推理（连续帧合批）、绘制与编码三个阶段并行执行：解码和绘制各占一个线程，推理在调用线程中进行，
+阶段之间通过有界队列传递帧，下游处理不过来时上游阻塞（背压），长视频的总耗时趋近于最慢阶段的耗时
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, List
+
+from metrics import metrics
+
+PIPELINE_UTILIZATION = metrics.gauge(
+    'yolo_video_pipeline_utilization', 'Busy fraction of each video pipeline stage in the last run', ['stage']
+)
+
+# 队列结束标记
+_END = object()
+
+
+class StageStats:
+    """流水线阶段统计：处理的帧数、忙碌时间和等待上游/下游的时间"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.starved = 0.0  # 等待上游的时间
+        self.blocked = 0.0  # 队列已满、等待下游的时间
+
+    def to_dict(self, wall: float) -> dict:
+        """转换为统计字典，utilization为忙碌时间占流水线总耗时的比例"""
+        return {
+            'items': self.items,
+            'busy_seconds': round(self.busy, 4),
+            'starved_seconds': round(self.starved, 4),
+            'blocked_seconds': round(self.blocked, 4),
+            'utilization': round(self.busy / wall, 3) if wall > 0 else 0.0
+        }
+
+
+class VideoPipeline:
+    """视频解码-推理-绘制流水线"""
+
+    def __init__(self, batch_size: int = 4, queue_size: int = 8):
+        """
+        初始化流水线
+
+        Args:
+            batch_size: 推理阶段一次最多合并的连续帧数
+            queue_size: 阶段之间队列的容量（帧）
+        """
+        self.batch_size = max(int(batch_size), 1)
+        self.queue_size = max(int(queue_size), 1)
+        self.logger = logging.getLogger(__name__)
+        self.stats = {}
+
+    def run(self, frames: Iterable[Any], infer: Callable[[List[Any]], List[Any]],
+            sink: Callable[[Any, Any], None]) -> dict:
+        """
+        运行流水线，直到所有帧处理完或任一阶段出错
+
+        推理阶段先阻塞等待一帧，再取走队列中已解码的帧（最多batch_size帧）一起推理，
+        解码快于推理时自然形成整批，解码较慢时不为凑批而等待
+
+        Args:
+            frames: 帧迭代器，在解码线程中迭代
+            infer: 推理函数，输入一批帧，返回逐帧结果，在调用线程中执行
+            sink: 输出函数，参数为(帧, 推理结果)，按帧顺序在绘制线程中调用
+
+        Returns:
+            各阶段统计（见StageStats.to_dict），另有wall_seconds为流水线总耗时
+
+        Raises:
+            任一阶段抛出的第一个异常（其余阶段随之停止）
+        """
+        decoded = queue.Queue(maxsize=self.queue_size)
+        inferred = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        stats = {name: StageStats(name) for name in ('decode', 'infer', 'sink')}
+
+        def fail(e: BaseException):
+            errors.append(e)
+            stop.set()
+
+        def put(q: queue.Queue, item, stage: StageStats) -> bool:
+            """放入下游队列，队列已满时等待；流水线已停止时返回False"""
+            start = time.perf_counter()
+            try:
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        continue
+                return False
+            finally:
+                stage.blocked += time.perf_counter() - start
+
+        def get(q: queue.Queue, stage: StageStats, block: bool = True):
+            """从上游队列取出一项，不阻塞且队列为空时返回None，流水线已停止时返回_END"""
+            start = time.perf_counter()
+            try:
+                while not stop.is_set():
+                    try:
+                        return q.get(timeout=0.1) if block else q.get_nowait()
+                    except queue.Empty:
+                        if not block:
+                            return None
+                return _END
+            finally:
+                stage.starved += time.perf_counter() - start
+
+        def decode():
+            stage = stats['decode']
+            try:
+                iterator = iter(frames)
+                while True:
+                    start = time.perf_counter()
+                    item = next(iterator, _END)
+                    stage.busy += time.perf_counter() - start
+                    if item is _END or not put(decoded, item, stage):
+                        break
+                    stage.items += 1
+            except BaseException as e:
+                fail(e)
+            finally:
+                put(decoded, _END, stage)
+
+        def output():
+            stage = stats['sink']
+            try:
+                while True:
+                    pair = get(inferred, stage)
+                    if pair is _END:
+                        break
+                    start = time.perf_counter()
+                    sink(*pair)
+                    stage.busy += time.perf_counter() - start
+                    stage.items += 1
+            except BaseException as e:
+                fail(e)
+
+        threads = [threading.Thread(target=decode, name='video-decode', daemon=True),
+                   threading.Thread(target=output, name='video-sink', daemon=True)]
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        stage = stats['infer']
+        try:
+            finished = False
+            while not finished:
+                item = get(decoded, stage)
+                if item is _END:
+                    break
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    item = get(decoded, stage, block=False)
+                    if item is None:
+                        break
+                    if item is _END:
+                        finished = True
+                        break
+                    batch.append(item)
+
+                start = time.perf_counter()
+                results = infer(batch)
+                stage.busy += time.perf_counter() - start
+                stage.items += len(batch)
+                for pair in zip(batch, results):
+                    if not put(inferred, pair, stage):
+                        break
+        except BaseException as e:
+            fail(e)
+        finally:
+            put(inferred, _END, stage)
+            for thread in threads:
+                thread.join()
+
+        wall = time.perf_counter() - wall_start
+        self.stats = {name: s.to_dict(wall) for name, s in stats.items()}
+        self.stats['wall_seconds'] = round(wall, 4)
+        for name in stats:
+            PIPELINE_UTILIZATION.set(self.stats[name]['utilization'], stage=name)
+        if errors:
+            raise errors[0]
+        return self.stats
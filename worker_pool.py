@@ -0,0 +1,248 @@
+"""
+多进程推理工作池模块
+每个工作进程加载独立的模型并固定PyTorch线程数，Web进程通过共享队列分发推理请求
+"""
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import replace
+from typing import Optional
+
+import numpy as np
+import torch
+
+from config import config, YOLOConfig
+from metrics import observe_stage
+
+
+def _worker_main(worker_id: int, yolo_config: YOLOConfig,
+                 requests: multiprocessing.Queue, results: multiprocessing.Queue):
+    """
+    工作进程入口：加载模型后循环处理请求队列
+
+    Args:
+        worker_id: 工作进程编号
+        yolo_config: 本进程的YOLO配置（线程数和CPU亲和性在加载模型时生效）
+        requests: 请求队列，元素为(请求ID, BGR原图)，None为停止信号
+        results: 结果队列，元素为(请求ID, 检测结果数组, 错误消息, 各阶段耗时)，
+            同一批次的耗时只随第一个结果回传；模型加载并预热完成后发送(None, 工作进程编号, None, {})
+    """
+    from batcher import collect_batch
+    from detector import YOLODetector
+    from memory import memory_policy
+    from utils_app import setup_logging
+
+    setup_logging()
+    logger = logging.getLogger(__name__)
+
+    worker_detector = YOLODetector(yolo_config)
+    if not worker_detector.load_model():
+        logger.error(f"工作进程 {worker_id} 模型加载失败，退出")
+        return
+    logger.info(f"工作进程 {worker_id} 已就绪 (torch线程数: {torch.get_num_threads()})")
+    results.put((None, worker_id, None, {}))
+    memory_policy.start()
+
+    max_wait = yolo_config.batch_max_wait_ms / 1000
+    while True:
+        batch = collect_batch(requests, max(yolo_config.batch_max_size, 1), max_wait)
+        stop = batch[-1] is None
+        batch = [item for item in batch if item is not None]
+
+        if batch:
+            try:
+                dets = worker_detector.infer_batch([im0 for _, im0 in batch])
+                timings = worker_detector.last_timings
+                for (request_id, _), det in zip(batch, dets):
+                    results.put((request_id, det.numpy(), None, timings))
+                    timings = {}
+            except Exception as e:
+                logger.error(f"工作进程 {worker_id} 推理失败: {e}")
+                for request_id, _ in batch:
+                    results.put((request_id, None, str(e), {}))
+
+        if stop:
+            break
+
+
+class WorkerPool:
+    """多进程推理工作池类"""
+
+    def __init__(self, yolo_config: Optional[YOLOConfig] = None, num_workers: Optional[int] = None,
+                 threads_per_worker: Optional[int] = None, timeout: Optional[float] = None):
+        """
+        初始化工作池
+
+        Args:
+            yolo_config: YOLO配置对象，如果为None则使用默认配置
+            num_workers: 工作进程数，如果为None则使用配置中的值，0表示不启用
+            threads_per_worker: 每个进程的PyTorch线程数，如果为None则使用配置中的值
+            timeout: 单个请求的最长等待时间（秒），如果为None则使用配置中的值
+        """
+        self.config = yolo_config or config.yolo
+        self.num_workers = num_workers if num_workers is not None else self.config.num_workers
+        self.threads_per_worker = threads_per_worker or self.config.worker_threads
+        self.timeout = timeout or self.config.worker_timeout
+        self.logger = logging.getLogger(__name__)
+
+        # spawn方式启动，避免fork继承父进程的PyTorch线程池状态
+        self._ctx = multiprocessing.get_context('spawn')
+        self._requests = None
+        self._results = None
+        self._processes = []
+        self._pending = {}
+        self._ready_workers = set()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._running = False
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用多进程推理"""
+        return self.num_workers > 0
+
+    @property
+    def ready(self) -> bool:
+        """是否已有工作进程完成模型加载和预热（请求只会被就绪的进程取走）"""
+        return bool(self._ready_workers)
+
+    @property
+    def queue_depth(self) -> int:
+        """等待结果的请求数"""
+        return len(self._pending)
+
+    def start(self):
+        """启动工作进程和结果收集线程（重复调用无副作用）"""
+        with self._lock:
+            if self._running:
+                return
+            self._requests = self._ctx.Queue()
+            self._results = self._ctx.Queue()
+            self._processes = [self._spawn(i) for i in range(self.num_workers)]
+            self._running = True
+
+        self._collector = threading.Thread(target=self._collect, name='worker-pool-collector', daemon=True)
+        self._collector.start()
+        atexit.register(self.stop)
+        self.logger.info(f"推理工作池已启动: {self.num_workers} 个进程, 每进程 {self.threads_per_worker} 线程")
+
+    def stop(self):
+        """通知工作进程退出并等待结束"""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for _ in self._processes:
+                self._requests.put(None)
+
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.logger.info("推理工作池已停止")
+
+    def submit(self, im0: np.ndarray) -> Future:
+        """
+        提交一张已解码的图片到工作池
+
+        Args:
+            im0: BGR格式的原图
+
+        Returns:
+            Future对象，结果为该图片的检测结果张量
+        """
+        if not self._running:
+            self.start()
+
+        future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = (future, time.monotonic())
+        self._requests.put((request_id, im0))
+        return future
+
+    def _worker_config(self, worker_id: int) -> YOLOConfig:
+        """
+        生成工作进程的配置：固定线程数，并把可用CPU按进程切分，避免多个进程绑定到同一组核心，不执行启动自测
+        """
+        cpus = self.config.cpu_affinity
+        if not cpus and hasattr(os, 'sched_getaffinity'):
+            cpus = sorted(os.sched_getaffinity(0))
+
+        affinity = None
+        if cpus and len(cpus) >= self.num_workers * self.threads_per_worker:
+            start = worker_id * self.threads_per_worker
+            affinity = cpus[start:start + self.threads_per_worker]
+
+        # 启动自测只记录日志，N个工作进程同时执行只会相互争抢CPU、拖慢就绪，工作进程中跳过
+        return replace(self.config, intra_op_threads=self.threads_per_worker, cpu_affinity=affinity,
+                       startup_benchmark_runs=0)
+
+    def _spawn(self, worker_id: int):
+        """启动一个工作进程"""
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._worker_config(worker_id), self._requests, self._results),
+            name=f'yolo-worker-{worker_id}',
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _collect(self):
+        """结果收集循环：把工作进程返回的结果交给对应的Future，并监控进程存活"""
+        last_check = time.monotonic()
+        while self._running:
+            # 按时间间隔检查进程存活和请求超时，存活进程持续返回结果时也不会推迟
+            if time.monotonic() - last_check >= 1.0:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                request_id, det, error, timings = self._results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            if request_id is None:
+                self._ready_workers.add(det)
+                self.logger.info(f"工作进程 {det} 已就绪 ({len(self._ready_workers)}/{self.num_workers})")
+                continue
+
+            # 工作进程中的阶段耗时记录在Web进程的指标中
+            for stage, seconds in timings.items():
+                observe_stage(stage, seconds)
+
+            entry = self._pending.pop(request_id, None)
+            if entry is None:
+                continue
+            future, _ = entry
+            if error is None:
+                future.set_result(torch.from_numpy(det))
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _check_workers(self):
+        """重启意外退出的工作进程，并让超时的请求失败"""
+        with self._lock:
+            if not self._running:
+                return
+            for i, process in enumerate(self._processes):
+                # exitcode为0表示进程自行退出（如模型加载失败），不再重启
+                if not process.is_alive() and process.exitcode != 0:
+                    self.logger.error(f"工作进程 {process.name} 异常退出 (exitcode={process.exitcode})，正在重启")
+                    self._ready_workers.discard(i)
+                    self._processes[i] = self._spawn(i)
+
+        now = time.monotonic()
+        for request_id, (future, submitted_at) in list(self._pending.items()):
+            if now - submitted_at > self.timeout and self._pending.pop(request_id, None):
+                future.set_exception(TimeoutError(f"推理请求超时 ({self.timeout:.0f}s)"))
+
+
+# 全局推理工作池实例
+worker_pool = WorkerPool()